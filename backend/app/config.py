@@ -20,6 +20,7 @@ class Settings(BaseSettings):
     documents_dir: Path = data_dir / "documents"
     chroma_dir: Path = data_dir / "chroma_db"
     models_dir: Path = data_dir / "models"
+    ocr_cache_dir: Path = data_dir / "ocr_cache"
     
     chroma_collection_name: str = "knowledge_base"
     
@@ -59,11 +60,33 @@ class Settings(BaseSettings):
     chunk_size: int = 512  # tokens
     chunk_overlap: int = 50  # tokens
     
+    # =========================
+    # Parsing
+    # =========================
+    ocr_cache_enabled: bool = True  # Keep OCR text on disk, keyed by image hash, tesseract version and pipeline version
+    ocr_cache_max_files: int = 5000  # Least recently used entries beyond this are deleted; 0 = no limit
+    
     # =========================
     # Search
     # =========================
     search_top_k: int = 5  # Number of results to return
     hybrid_search_semantic_weight: float = 0.7  # Weight for semantic vs keyword
+    search_cache_size: int = 256  # Recent vector queries kept for reuse (0 = off)
+    search_cache_similarity: float = 0.97  # Cosine similarity needed for a near-duplicate hit
+    search_cache_ttl_seconds: float = 300.0  # Cached results older than this are ignored
+    query_embed_batch_size: int = 32  # Max concurrent queries embedded in one call
+    query_embed_batch_window_ms: float = 5.0  # How long to wait for more queries to batch
+    
+    # =========================
+    # Vector Store
+    # =========================
+    # Experimental int8 sidecar scan in front of Chroma (unfiltered queries only)
+    quantized_index_enabled: bool = False
+    quantized_index_rerank_factor: int = 4  # Candidates fetched per result for fp32 rerank
+    quantized_index_nprobe: int = 8  # IVF lists scanned per query (collections >10K chunks)
+    quantized_index_pca_components: int = 0  # Project to this many dims before quantizing (0 = off)
+    quantized_index_dtype: str = "int8"  # Code type: "int8" (4x smaller) or "float16" (2x, more accurate)
+    quantized_index_save_interval_seconds: float = 30.0  # Min time between index saves outside bulk imports
     
     # =========================
     # Server
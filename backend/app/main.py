@@ -13,6 +13,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from .config import settings
 from .routers import documents_router, search_router, chat_router, settings_router, google_auth_router, gmail_router, drive_router, folders_router
 from .services.vector_store import get_vector_store
+from .utils import shutdown_parse_pool
 
 # Configure logging
 logging.basicConfig(
@@ -40,6 +41,8 @@ async def lifespan(app: FastAPI):
     yield
     
     logger.info("Shutting down...")
+    vector_store.flush()
+    shutdown_parse_pool()
 
 
 # Create FastAPI app
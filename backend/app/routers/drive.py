@@ -4,6 +4,7 @@ from pydantic import BaseModel
 
 from ..services.google.drive import DriveService, get_drive_service
 from ..services.google.auth import GoogleAuthService
+from ..services.vector_store import get_vector_store
 
 router = APIRouter(prefix="/drive", tags=["drive"])
 
@@ -34,7 +35,8 @@ async def sync_drive(
     Sync recent files from Google Drive.
     """
     try:
-        stats = await service.sync_drive(limit=request.limit)
+        with get_vector_store().bulk_ingest():
+            stats = await service.sync_drive(limit=request.limit)
         return SyncResponse(
             **stats,
             message="Drive sync completed successfully"
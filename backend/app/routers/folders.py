@@ -184,7 +184,8 @@ async def scan_folder(
     
     async def _run_scan():
         try:
-            await scanner.scan_folder(path, ingestion, is_background=True)
+            with ingestion.vector_store.bulk_ingest():
+                await scanner.scan_folder(path, ingestion, is_background=True)
         except Exception as e:
             logger.error(f"Background scan failed: {e}")
             manager = get_scan_manager()
@@ -229,7 +230,8 @@ async def scan_all_folders(
             if source.enabled and not manager.should_stop:
                 try:
                     # Pass is_background=False so it doesn't reset the manager
-                    stats = await scanner.scan_folder(source.path, ingestion, is_background=False)
+                    with ingestion.vector_store.bulk_ingest():
+                        stats = await scanner.scan_folder(source.path, ingestion, is_background=False)
                     for key in ["discovered", "new", "modified", "unchanged", "indexed", "errors"]:
                         total_stats[key] += stats[key]
                     total_stats["folders_scanned"] += 1
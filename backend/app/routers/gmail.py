@@ -4,6 +4,7 @@ from pydantic import BaseModel, Field
 
 from ..services.google.gmail import GmailService, get_gmail_service
 from ..services.google.auth import GoogleAuthService
+from ..services.vector_store import get_vector_store
 
 router = APIRouter(prefix="/gmail", tags=["gmail"])
 
@@ -55,11 +56,12 @@ async def sync_gmail(
       sender patterns (noreply@, newsletter@, etc.) and subject keywords (sale, discount, etc.)
     """
     try:
-        stats = await service.sync_emails(
-            max_results=request.max_results,
-            filter_type=request.filter_type,
-            skip_promotional=request.skip_promotional
-        )
+        with get_vector_store().bulk_ingest():
+            stats = await service.sync_emails(
+                max_results=request.max_results,
+                filter_type=request.filter_type,
+                skip_promotional=request.skip_promotional
+            )
         
         filter_desc = f"filter={request.filter_type}"
         if request.skip_promotional:
@@ -107,3 +107,11 @@ async def trigger_reindex(
     except Exception as e:
         logger.error(f"Reindex failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/cache/stats", tags=["admin"])
+async def get_cache_stats(
+    search_service: SearchService = Depends(get_search_service),
+):
+    """Hit/miss counters and size of the vector query cache."""
+    return search_service.vector_store.get_cache_stats()
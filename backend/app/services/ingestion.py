@@ -46,7 +46,7 @@ import uuid
 import hashlib
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import Iterable, List, Optional, Dict, Any
 import aiofiles
 
 from ..config import settings
@@ -56,8 +56,8 @@ from ..models.documents import (
     DocumentType,
     DocumentChunk,
 )
-from ..utils.parsers import parse_document_bytes, detect_document_type, get_parser
-from ..utils.chunking import chunk_text, Chunk
+from ..utils.parsers import parse_document_bytes_async, detect_document_type, get_parser
+from ..utils.chunking import iter_chunks, Chunk
 from .vector_store import VectorStoreService, get_vector_store
 
 # Import embedding provider (lazy import to avoid circular dependencies)
@@ -202,14 +202,14 @@ class IngestionService:
         
         # Step 3: Detect type
         try:
-            doc_type = detect_document_type(filename)
+            doc_type = detect_document_type(filename, content)
         except ValueError as e:
             logger.error(f"Unsupported file type: {filename}")
             raise ValueError(f"Unsupported file type: {e}")
         
         # Step 4: Parse
         try:
-            text, _ = parse_document_bytes(content, filename)
+            text, _ = await parse_document_bytes_async(content, filename)
         except Exception as e:
             logger.error(f"Failed to parse document: {e}")
             raise ValueError(f"Failed to parse document: {e}")
@@ -217,9 +217,8 @@ class IngestionService:
         if not text.strip():
             raise ValueError("Document contains no extractable text")
         
-        # Step 5: Chunk
-        chunks = chunk_text(text)
-        logger.info(f"Created {len(chunks)} chunks")
+        # Step 5: Chunk (lazily; chunks are embedded and stored as they are produced)
+        chunks = iter_chunks(text)
         
         # Step 6: Store file locally
         file_path = await self._store_file(content, filename, doc_id)
@@ -233,7 +232,6 @@ class IngestionService:
             doc_type=doc_type,
             content=text,
             file_path=str(file_path),
-            chunk_count=len(chunks),
             created_at=now,
             updated_at=now,
             metadata=metadata or {},
@@ -242,7 +240,7 @@ class IngestionService:
         # Step 8: Store chunks in vector store
         # NOTE: For now, we store chunks WITHOUT embeddings
         # Embeddings will be added in Phase 3
-        await self._store_chunks(document, chunks)
+        document.chunk_count = await self._store_chunks(document, chunks)
         
         # Save document reference
         self._documents[doc_id] = document
@@ -265,7 +263,8 @@ class IngestionService:
         if not file_path.exists():
             raise FileNotFoundError(f"File not found: {file_path}")
         
-        content = file_path.read_bytes()
+        async with aiofiles.open(file_path, 'rb') as f:
+            content = await f.read()
         return await self.ingest_bytes(
             content=content,
             filename=file_path.name,
@@ -311,8 +310,7 @@ class IngestionService:
             doc_type = DocumentType.TXT
 
         # Step 5: Chunk (Skip parsing as we already have text)
-        chunks = chunk_text(text)
-        logger.info(f"Created {len(chunks)} chunks")
+        chunks = iter_chunks(text)
         
         # Step 6: Store file locally
         file_path = await self._store_file(content_bytes, filename, doc_id)
@@ -326,14 +324,13 @@ class IngestionService:
             doc_type=doc_type,
             content=text,
             file_path=str(file_path),
-            chunk_count=len(chunks),
             created_at=now,
             updated_at=now,
             metadata=metadata or {},
         )
         
         # Step 8: Store chunks in vector store
-        await self._store_chunks(document, chunks)
+        document.chunk_count = await self._store_chunks(document, chunks)
         
         # Save document reference
         self._documents[doc_id] = document
@@ -606,14 +603,22 @@ class IngestionService:
         logger.info(f"Stored file: {file_path}")
         return file_path
     
+    def _log_chunk_stats(self, token_counts: List[int]) -> None:
+        logger.info(
+            f"Created {len(token_counts)} chunks "
+            f"(~{sum(token_counts)} tokens, {min(token_counts, default=0)}-{max(token_counts, default=0)} per chunk)"
+        )
+    
     async def _store_chunks(
         self,
         document: Document,
-        chunks: List[Chunk],
-    ) -> None:
+        chunks: Iterable[Chunk],
+    ) -> int:
         """
         Store document chunks in the vector store WITH REAL EMBEDDINGS.
         
+        Chunks may come from a generator; returns how many were stored.
+        
         EMBEDDING PROCESS:
         ==================
         
@@ -636,6 +641,9 @@ class IngestionService:
         - Reduces API call overhead (for OpenAI)
         - More efficient memory usage
         
+        Batches go through VectorStoreService.add_documents_streaming, which
+        writes one batch to ChromaDB while the next one is being embedded.
+        
         WHAT GETS STORED IN CHROMADB:
         =============================
         
@@ -645,9 +653,6 @@ class IngestionService:
         - document: "The actual chunk text..."
         - metadata: {document_id, filename, chunk_index, ...}
         """
-        if not chunks:
-            return
-        
         # Import embedding provider here to avoid circular imports
         from .embeddings import get_embedding_provider
         
@@ -655,75 +660,79 @@ class IngestionService:
         embedding_provider = get_embedding_provider()
         
         logger.info(
-            f"Generating embeddings for {len(chunks)} chunks "
+            f"Generating embeddings for chunks of {document.id} "
             f"using {embedding_provider.model_name}"
         )
         
-        # Prepare data for ChromaDB
-        ids = []
-        documents = []
-        metadatas = []
+        token_counts: List[int] = []
         
-        for chunk in chunks:
-            # Generate unique chunk ID
-            chunk_id = f"{document.id}_chunk_{chunk.index}"
-            
-            ids.append(chunk_id)
-            documents.append(chunk.content)
-            metadatas.append({
-                "document_id": document.id,
-                "filename": document.filename,
-                "doc_type": document.doc_type.value,
-                "chunk_index": chunk.index,
-                "start_char": chunk.start_char,
-                "end_char": chunk.end_char,
-                "token_count": chunk.token_count,
-            })
-        
-        # Generate REAL embeddings using the configured provider
-        # This is the key change from Phase 2!
-        try:
-            embeddings = embedding_provider.embed_batch(documents)
-            logger.info(f"Generated {len(embeddings)} embeddings ({embedding_provider.dimension} dimensions)")
-        except ValueError as e:
-            # Check if it's a quota error - try fallback to local
-            error_str = str(e)
-            if "quota" in error_str.lower() or "insufficient_quota" in error_str.lower():
-                logger.warning(f"OpenAI quota error detected during indexing, attempting fallback to local embeddings: {e}")
-                try:
-                    from ..services.embeddings import get_local_embedding_provider
-                    local_provider = get_local_embedding_provider()
-                    embeddings = local_provider.embed_batch(documents)
-                    logger.info(f"Successfully used local embeddings as fallback. Generated {len(embeddings)} embeddings ({local_provider.dimension} dimensions)")
-                    # Update the embedding provider reference for dimension check
-                    embedding_provider = local_provider
-                except Exception as fallback_error:
-                    logger.error(f"Fallback to local embeddings also failed: {fallback_error}")
-                    raise ValueError(f"Embedding generation failed. OpenAI quota exceeded and local fallback failed: {fallback_error}")
-            else:
+        def records():
+            """One (id, text, metadata) record per chunk for ChromaDB."""
+            for chunk in chunks:
+                token_counts.append(chunk.token_count)
+                yield (
+                    # Unique chunk ID
+                    f"{document.id}_chunk_{chunk.index}",
+                    chunk.content,
+                    {
+                        "document_id": document.id,
+                        "filename": document.filename,
+                        "doc_type": document.doc_type.value,
+                        "chunk_index": chunk.index,
+                        "start_char": chunk.start_char,
+                        "end_char": chunk.end_char,
+                        "token_count": chunk.token_count,
+                    },
+                )
+        
+        def embed(documents: List[str]) -> List[List[float]]:
+            """Generate REAL embeddings for one batch using the configured provider."""
+            nonlocal embedding_provider
+            try:
+                embeddings = embedding_provider.embed_batch(documents)
+            except ValueError as e:
+                # Check if it's a quota error - try fallback to local
+                error_str = str(e)
+                if "quota" in error_str.lower() or "insufficient_quota" in error_str.lower():
+                    logger.warning(f"OpenAI quota error detected during indexing, attempting fallback to local embeddings: {e}")
+                    try:
+                        from ..services.embeddings import get_local_embedding_provider
+                        local_provider = get_local_embedding_provider()
+                        embeddings = local_provider.embed_batch(documents)
+                        logger.info(f"Successfully used local embeddings as fallback. Generated {len(embeddings)} embeddings ({local_provider.dimension} dimensions)")
+                        # Later batches go straight to the local provider
+                        embedding_provider = local_provider
+                    except Exception as fallback_error:
+                        logger.error(f"Fallback to local embeddings also failed: {fallback_error}")
+                        raise ValueError(f"Embedding generation failed. OpenAI quota exceeded and local fallback failed: {fallback_error}")
+                else:
+                    logger.error(f"Failed to generate embeddings: {e}")
+                    raise ValueError(f"Embedding generation failed: {e}")
+            except Exception as e:
                 logger.error(f"Failed to generate embeddings: {e}")
                 raise ValueError(f"Embedding generation failed: {e}")
-        except Exception as e:
-            logger.error(f"Failed to generate embeddings: {e}")
-            raise ValueError(f"Embedding generation failed: {e}")
-        
-        # Verify embedding dimensions match what ChromaDB expects
-        if embeddings and len(embeddings[0]) != settings.embedding_dimension:
-            logger.warning(
-                f"Embedding dimension ({len(embeddings[0])}) differs from "
-                f"configured dimension ({settings.embedding_dimension}). "
-                f"This may cause issues with existing data."
-            )
+            
+            # Verify embedding dimensions match what ChromaDB expects
+            if len(embeddings) and len(embeddings[0]) != settings.embedding_dimension:
+                logger.warning(
+                    f"Embedding dimension ({len(embeddings[0])}) differs from "
+                    f"configured dimension ({settings.embedding_dimension}). "
+                    f"This may cause issues with existing data."
+                )
+            return embeddings
         
-        # Add to vector store
-        self.vector_store.add_documents(
-            ids=ids,
-            embeddings=embeddings,
-            documents=documents,
-            metadatas=metadatas,
-        )
+        # Embed the next batch while the previous one is written, so neither
+        # the embeddings nor the records of the whole document are held at once
+        try:
+            stored = self.vector_store.add_documents_streaming(records(), embed)
+        except Exception:
+            # Don't leave the batches stored before the failure behind
+            self.vector_store.delete_by_metadata({"document_id": document.id})
+            raise
         
-        logger.info(f"Stored {len(chunks)} chunks with embeddings for document {document.id}")
+        self._log_chunk_stats(token_counts)
+        logger.info(f"Stored {stored} chunks with embeddings for document {document.id}")
+        return stored
 
 
 # =============================================================================
@@ -0,0 +1,544 @@
+"""Int8 scalar-quantized sidecar index for first-stage vector retrieval."""
+
+import functools
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CACHE_LINE = 64  # bytes
+
+
+def _pad_up(n: int, multiple: int) -> int:
+    return -(-n // multiple) * multiple
+
+
+def _aligned_zeros(shape, dtype) -> np.ndarray:
+    """Zeroed array whose data starts on a cache-line boundary."""
+    dtype = np.dtype(dtype)
+    nbytes = int(np.prod(shape)) * dtype.itemsize
+    raw = np.zeros(nbytes + CACHE_LINE, dtype=np.uint8)
+    start = -raw.ctypes.data % CACHE_LINE
+    return raw[start:start + nbytes].view(dtype).reshape(shape)
+
+
+def _synchronized(method):
+    """Run the method under the instance's lock (searches mutate state too, via _flush)."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class QuantizedIndex:
+    """
+    In-process, int8 scalar-quantized copy of the collection's embeddings.
+
+    Each dimension d is mapped affinely onto int8 with a per-dimension
+    scale/offset fitted on the first batch added (and widened, requantizing
+    the stored codes, if a later batch falls outside that range):
+
+        x[d] ~= offset[d] + scale[d] * (code[d] + 128)
+
+    Scanning the int8 codes moves a quarter of the bytes an fp32 scan
+    would, so it is used as a cheap first stage that picks candidate ids.
+    VectorStoreService reranks those candidates against the exact fp32
+    embeddings stored in Chroma.
+
+    With dtype="float16" the codes are the vectors themselves in half
+    precision (scale 1, offset -128, so the formulas below still hold):
+    twice the bytes of int8 but no range fitting and better candidates.
+
+    Once the index holds IVF_MIN_VECTORS or more, an IVF (inverted file)
+    layer is trained: k-means puts ceil(sqrt(N)) centroids over the data
+    and every row is assigned to its nearest centroid. A query then scores
+    the centroids first and scans only the rows of the `nprobe` best lists,
+    about nprobe * N / nlist rows instead of N.
+
+    Codes are stored dimension-major (structure of arrays, shape (D, N)):
+    the scan is then a GEMV `weights @ codes` that streams each dimension
+    contiguously across all vectors, instead of N short per-vector dot
+    products. New vectors are buffered row-major and transposed into the
+    matrix in one go on the next flush.
+
+    The matrix starts on a cache-line boundary and its width is padded
+    with zero columns to a multiple of COLUMN_PAD, so every dimension's row
+    is cache-line aligned and the scan never has a ragged tail; the number
+    of live columns is tracked separately. Spare capacity also lets later
+    flushes append in place.
+
+    With `pca_components` set (and smaller than the embedding dimension),
+    vectors are projected onto their top principal directions before being
+    quantized, so D in everything above is the reduced dimension and the
+    scan moves proportionally fewer bytes. The projection is an uncentered
+    PCA (the top right singular vectors of a sample of the stored rows,
+    fitted once PCA_SAMPLES_PER_COMPONENT * k rows exist). Being a plain
+    orthonormal projection, inner products and L2 distances in the reduced
+    space approximate the originals for every Chroma space; the fp32
+    rerank restores exact ordering.
+
+    Files (under `directory`):
+        sq8.npy         codes (int8 or float16), shape (D, N padded to COLUMN_PAD)
+        sq8_params.npz  scale, offset, the fp32 squared norms per row and,
+                        when trained, the IVF centroids and row assignments
+        sq8_ids.json    chunk ids, parallel to the columns of sq8.npy
+        rot.npy         PCA projection, shape (D_in, D), when fitted
+    """
+
+    # Vectors dequantized per step of the scan (bounds the fp32 temporary)
+    SCAN_BLOCK = 16384
+    # Matrix width granularity: one cache line of int8 codes
+    COLUMN_PAD = CACHE_LINE
+    # Below this size a full scan is cheap enough that IVF isn't worth it
+    IVF_MIN_VECTORS = 10_000
+    # k-means training sample size per centroid, and Lloyd iterations
+    IVF_SAMPLES_PER_LIST = 32
+    IVF_ITERATIONS = 10
+    # Rows needed per principal component before the PCA is fitted, and
+    # the cap on rows fed to the SVD
+    PCA_SAMPLES_PER_COMPONENT = 4
+    PCA_MAX_SAMPLES = 20_000
+
+    def __init__(self, directory: Path, nprobe: int = 8, pca_components: int = 0, dtype: str = "int8"):
+        if dtype not in ("int8", "float16"):
+            raise ValueError(f"Unsupported quantized index dtype: {dtype}")
+        self.directory = directory
+        self._lock = threading.RLock()
+        self.code_dtype = np.dtype(dtype)
+        self.nprobe = nprobe
+        self.pca_components = pca_components
+        self._rotation: Optional[np.ndarray] = None  # (D_in, D) float32 PCA projection
+        self._codes: Optional[np.ndarray] = None     # (D, capacity) codes, one column per vector
+        self._size = 0                                # Live columns in _codes
+        self._pending: List[np.ndarray] = []          # (n, D) code batches not yet transposed in
+        self._sq_norms: Optional[np.ndarray] = None  # (N,) float32, ||x||^2 of the fp32 vectors
+        self._scale: Optional[np.ndarray] = None     # (D,) float32
+        self._offset: Optional[np.ndarray] = None    # (D,) float32
+        self._ids: List[str] = []
+        self._id_to_row: Dict[str, int] = {}
+        # IVF layer
+        self._centroids: Optional[np.ndarray] = None  # (nlist, D) float32
+        self._assign: Optional[np.ndarray] = None     # (N,) int32 centroid per row
+        self._trained_size = 0
+        self._lists: Optional[List[np.ndarray]] = None  # Row ids per centroid, built lazily
+        self._dirty = False  # Changed since the last load/save
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def dirty(self) -> bool:
+        """True when the in-memory index has changes save() has not written."""
+        return self._dirty
+
+    @property
+    def dimension(self) -> Optional[int]:
+        """Dimension of the embeddings the index accepts (before any PCA)."""
+        if self._rotation is not None:
+            return int(self._rotation.shape[0])
+        return None if self._scale is None else int(self._scale.shape[0])
+
+    @property
+    def _codes_path(self) -> Path:
+        return self.directory / "sq8.npy"
+
+    @property
+    def _params_path(self) -> Path:
+        return self.directory / "sq8_params.npz"
+
+    @property
+    def _ids_path(self) -> Path:
+        return self.directory / "sq8_ids.json"
+
+    @property
+    def _rotation_path(self) -> Path:
+        return self.directory / "rot.npy"
+
+    # =========================================================================
+    # PERSISTENCE
+    # =========================================================================
+
+    @_synchronized
+    def load(self) -> bool:
+        """Load the index from disk. Returns False if no (valid) index exists."""
+        if not (self._codes_path.exists() and self._params_path.exists() and self._ids_path.exists()):
+            return False
+
+        try:
+            codes = np.load(self._codes_path, mmap_mode="r")
+            params = np.load(self._params_path)
+            ids = json.loads(self._ids_path.read_text(encoding="utf-8"))
+            rotation = np.load(self._rotation_path) if self._rotation_path.exists() else None
+            if codes.ndim != 2 or codes.shape[1] != _pad_up(len(ids), self.COLUMN_PAD) or codes.dtype != self.code_dtype:
+                logger.warning("Quantized index files are inconsistent, ignoring them")
+                return False
+            k = self.pca_components
+            if rotation is not None:
+                stale = rotation.shape[1] != codes.shape[0] or rotation.shape[1] != k
+            else:
+                stale = 0 < k < codes.shape[0] and len(ids) >= k * self.PCA_SAMPLES_PER_COMPONENT
+            if stale:
+                logger.info("Quantized index PCA does not match the configured components, ignoring it")
+                return False
+        except Exception as e:
+            logger.warning(f"Could not load quantized index: {e}")
+            return False
+
+        self._codes = codes
+        self._size = len(ids)
+        self._pending = []
+        self._scale = params["scale"]
+        self._offset = params["offset"]
+        self._sq_norms = params["sq_norms"]
+        if "centroids" in params.files:
+            self._centroids = params["centroids"]
+            self._assign = params["assign"]
+            self._trained_size = int(params["trained_size"])
+            self._lists = None
+        self._rotation = rotation
+        self._ids = ids
+        self._id_to_row = {cid: i for i, cid in enumerate(ids)}
+        self._dirty = False
+        logger.info(f"Loaded quantized index with {len(ids)} vectors")
+        return True
+
+    @_synchronized
+    def save(self) -> None:
+        """Persist the index next to the Chroma database."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._flush()
+        if self._codes is None:
+            for path in (self._codes_path, self._params_path, self._ids_path, self._rotation_path):
+                path.unlink(missing_ok=True)
+            return
+
+        if self._rotation is not None:
+            np.save(self._rotation_path, self._rotation)
+        else:
+            self._rotation_path.unlink(missing_ok=True)
+
+        np.save(self._codes_path, self._codes[:, :_pad_up(self._size, self.COLUMN_PAD)])
+        params = {"scale": self._scale, "offset": self._offset, "sq_norms": self._sq_norms}
+        if self._centroids is not None:
+            params.update(
+                centroids=self._centroids,
+                assign=self._assign,
+                trained_size=np.int64(self._trained_size),
+            )
+        np.savez(self._params_path, **params)
+        self._ids_path.write_text(json.dumps(self._ids), encoding="utf-8")
+        # The in-memory buffer stays writable, so later adds keep appending
+        # into its spare capacity instead of copying the whole matrix
+        self._dirty = False
+
+    @_synchronized
+    def clear(self) -> None:
+        self._dirty = True
+        self._codes = None
+        self._size = 0
+        self._pending = []
+        self._sq_norms = None
+        self._scale = None
+        self._offset = None
+        self._rotation = None
+        self._ids = []
+        self._id_to_row = {}
+        self._clear_ivf()
+
+    def _clear_ivf(self) -> None:
+        self._centroids = None
+        self._assign = None
+        self._trained_size = 0
+        self._lists = None
+
+    # =========================================================================
+    # WRITES
+    # =========================================================================
+
+    @_synchronized
+    def add(self, ids: Sequence[str], embeddings) -> None:
+        """Quantize and append embeddings. Existing ids are replaced."""
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or not len(ids):
+            return
+        self._dirty = True
+
+        existing = [cid for cid in ids if cid in self._id_to_row]
+        if existing:
+            self.remove(existing)
+
+        if self.dimension != vectors.shape[1]:
+            self.clear()
+        if self._rotation is not None:
+            vectors = vectors @ self._rotation
+
+        if self._scale is None:
+            self._fit(vectors)
+        else:
+            self._widen_range(vectors)
+
+        codes = self._quantize(vectors)
+        sq_norms = np.einsum("nd,nd->n", vectors, vectors)
+
+        self._pending.append(codes)
+        if self._sq_norms is None:
+            self._sq_norms = sq_norms
+        else:
+            self._sq_norms = np.concatenate([self._sq_norms, sq_norms])
+
+        for cid in ids:
+            self._id_to_row[cid] = len(self._ids)
+            self._ids.append(cid)
+
+        k = self.pca_components
+        if (self._rotation is None and 0 < k < vectors.shape[1]
+                and len(self._ids) >= k * self.PCA_SAMPLES_PER_COMPONENT):
+            self._fit_rotation()
+
+        if self._centroids is not None and len(self._ids) < 2 * self._trained_size:
+            # Incremental: route the new rows to their nearest existing list
+            self._assign = np.concatenate([self._assign, self._nearest_centroid(codes)])
+            self._lists = None
+        elif len(self._ids) >= self.IVF_MIN_VECTORS:
+            # First time over the threshold, or the data doubled since training
+            self._train_ivf()
+
+    @_synchronized
+    def remove(self, ids: Sequence[str]) -> int:
+        """Drop rows for the given ids. Returns the number removed."""
+        rows = [self._id_to_row[cid] for cid in ids if cid in self._id_to_row]
+        if not rows:
+            return 0
+
+        self._dirty = True
+        self._flush()
+        keep = np.ones(len(self._ids), dtype=bool)
+        keep[rows] = False
+        kept = self._codes[:, :self._size][:, keep]
+        self._codes = _aligned_zeros((kept.shape[0], _pad_up(kept.shape[1], self.COLUMN_PAD)), self.code_dtype)
+        self._codes[:, :kept.shape[1]] = kept
+        self._size = kept.shape[1]
+        self._sq_norms = self._sq_norms[keep]
+        if self._assign is not None:
+            self._assign = self._assign[keep]
+            self._lists = None
+        self._ids = [cid for cid, k in zip(self._ids, keep) if k]
+        self._id_to_row = {cid: i for i, cid in enumerate(self._ids)}
+        if not self._ids:
+            self.clear()
+        return len(rows)
+
+    def _fit(self, vectors: np.ndarray, lo=None, hi=None) -> None:
+        if self.code_dtype == np.float16:
+            # Identity mapping: x = -128 + 1 * (code + 128)
+            self._offset = np.full(vectors.shape[1], -128.0, dtype=np.float32)
+            self._scale = np.ones(vectors.shape[1], dtype=np.float32)
+            return
+        lo = vectors.min(axis=0) if lo is None else np.minimum(lo, vectors.min(axis=0))
+        hi = vectors.max(axis=0) if hi is None else np.maximum(hi, vectors.max(axis=0))
+        # Leave headroom so most later batches fit without refitting
+        margin = (hi - lo) * 0.1 + 1e-6
+        lo, hi = lo - margin, hi + margin
+        self._offset = lo.astype(np.float32)
+        self._scale = ((hi - lo) / 255.0).astype(np.float32)
+
+    def _widen_range(self, vectors: np.ndarray) -> None:
+        """Refit and requantize the stored codes if `vectors` exceed the current range."""
+        if self.code_dtype == np.float16:
+            return
+        lo = self._offset
+        hi = self._offset + 255.0 * self._scale
+        if (vectors.min(axis=0) >= lo).all() and (vectors.max(axis=0) <= hi).all():
+            return
+
+        self._flush()
+        stored = None if self._codes is None else self._dequantize(self._codes[:, :self._size].T)
+        self._fit(vectors, lo, hi)
+        if stored is not None:
+            self._codes = None
+            self._pending = [self._quantize(stored)]
+            self._size = 0
+            self._flush()
+
+    def _fit_rotation(self) -> None:
+        """Fit the PCA on a sample of the stored rows and re-encode the index in the reduced space."""
+        self._flush()
+        rng = np.random.default_rng(0)
+        sample_size = min(self._size, self.PCA_MAX_SAMPLES)
+        sample_rows = np.sort(rng.choice(self._size, size=sample_size, replace=False))
+        sample = self._dequantize(self._codes[:, sample_rows].T)
+        _, _, vt = np.linalg.svd(sample, full_matrices=False)
+        rotation = np.ascontiguousarray(vt[:self.pca_components].T, dtype=np.float32)
+
+        # Stored rows are only available as codes; project their dequantized values
+        projected = np.concatenate([
+            self._dequantize(self._codes[:, start:min(start + self.SCAN_BLOCK, self._size)].T) @ rotation
+            for start in range(0, self._size, self.SCAN_BLOCK)
+        ])
+        self._rotation = rotation
+        self._sq_norms = np.einsum("nd,nd->n", projected, projected)
+        self._codes = None
+        self._size = 0
+        self._fit(projected)
+        self._pending = [self._quantize(projected)]
+        self._flush()
+        self._clear_ivf()
+        logger.info(f"Fitted PCA: {rotation.shape[0]} -> {rotation.shape[1]} dimensions over {sample_size} vectors")
+
+    def _quantize(self, vectors: np.ndarray) -> np.ndarray:
+        if self.code_dtype == np.float16:
+            return vectors.astype(np.float16)
+        codes = np.rint((vectors - self._offset) / self._scale) - 128
+        return np.clip(codes, -128, 127).astype(np.int8)
+
+    def _dequantize(self, codes: np.ndarray) -> np.ndarray:
+        """Row-major (n, D) codes back to approximate fp32 vectors."""
+        if self.code_dtype == np.float16:
+            return codes.astype(np.float32)
+        return self._offset + self._scale * (codes.astype(np.float32) + 128.0)
+
+    def _flush(self) -> None:
+        """Transpose buffered batches into the (D, N) matrix."""
+        if not self._pending:
+            return
+
+        needed = self._size + sum(len(batch) for batch in self._pending)
+        if self._codes is None or needed > self._codes.shape[1] or not self._codes.flags.writeable:
+            # Grow geometrically; a read-only memmap is copied into a fresh buffer
+            capacity = _pad_up(max(needed, self._size * 3 // 2), self.COLUMN_PAD)
+            grown = _aligned_zeros((self._scale.shape[0], capacity), self.code_dtype)
+            if self._codes is not None:
+                grown[:, :self._size] = self._codes[:, :self._size]
+            self._codes = grown
+
+        col = self._size
+        for batch in self._pending:
+            self._codes[:, col:col + len(batch)] = batch.T
+            col += len(batch)
+        self._size = col
+        self._pending = []
+
+    # =========================================================================
+    # IVF
+    # =========================================================================
+
+    def _train_ivf(self) -> None:
+        """Run k-means on a sample of the (dequantized) rows and assign every row."""
+        self._flush()
+        total = len(self._ids)
+        nlist = int(np.ceil(np.sqrt(total)))
+        rng = np.random.default_rng(0)
+        sample_size = min(total, nlist * self.IVF_SAMPLES_PER_LIST)
+        sample_rows = np.sort(rng.choice(total, size=sample_size, replace=False))
+        sample = self._dequantize(self._codes[:, sample_rows].T)
+
+        centroids = sample[rng.choice(sample_size, size=nlist, replace=False)].copy()
+        for _ in range(self.IVF_ITERATIONS):
+            nearest = self._nearest(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, nearest, sample)
+            counts = np.bincount(nearest, minlength=nlist)
+            filled = counts > 0
+            # Empty lists keep their previous centroid
+            centroids[filled] = sums[filled] / counts[filled, None]
+
+        self._centroids = centroids
+        self._assign = self._nearest_centroid(self._codes[:, :self._size].T)
+        self._trained_size = total
+        self._lists = None
+        logger.info(f"Trained IVF layer: {nlist} lists over {total} vectors")
+
+    @staticmethod
+    def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        # argmin ||x - c||^2 == argmax (x.c - ||c||^2 / 2)
+        half_norms = 0.5 * np.einsum("kd,kd->k", centroids, centroids)
+        return np.argmax(vectors @ centroids.T - half_norms, axis=1).astype(np.int32)
+
+    def _nearest_centroid(self, codes: np.ndarray) -> np.ndarray:
+        out = np.empty(codes.shape[0], dtype=np.int32)
+        for start in range(0, codes.shape[0], self.SCAN_BLOCK):
+            block = self._dequantize(codes[start:start + self.SCAN_BLOCK])
+            out[start:start + block.shape[0]] = self._nearest(block, self._centroids)
+        return out
+
+    def _probe_rows(self, q: np.ndarray, space: str) -> Optional[np.ndarray]:
+        """Rows in the nprobe lists closest to the query, or None to scan everything."""
+        if self._centroids is None:
+            return None
+
+        if self._lists is None:
+            order = np.argsort(self._assign, kind="stable")
+            bounds = np.searchsorted(self._assign[order], np.arange(len(self._centroids) + 1))
+            self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(self._centroids))]
+
+        sims = self._centroids @ q
+        if space == "l2":
+            sims -= 0.5 * np.einsum("kd,kd->k", self._centroids, self._centroids)
+        nprobe = min(self.nprobe, len(self._centroids))
+        probe = np.argpartition(-sims, nprobe - 1)[:nprobe]
+        return np.sort(np.concatenate([self._lists[c] for c in probe]))
+
+    # =========================================================================
+    # SEARCH
+    # =========================================================================
+
+    @_synchronized
+    def search(self, query_embedding, n: int, space: str = "l2") -> List[str]:
+        """
+        Return up to `n` candidate ids, best first, by approximate distance.
+
+        Only the ranking matters here, so terms that are constant for a
+        given query (such as ||q||^2) are dropped.
+        """
+        if not self._ids or n <= 0:
+            return []
+
+        self._flush()
+        q = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+        if self._rotation is not None:
+            q = q @ self._rotation
+        rows = self._probe_rows(q, space)
+        if rows is not None and len(rows) < n:
+            # Probed lists are too small to fill the request
+            rows = None
+
+        # x.q ~= codes.(scale*q) + const
+        weights = self._scale * q
+        dots = self._scan(weights, rows)
+        sq_norms = self._sq_norms if rows is None else self._sq_norms[rows]
+
+        # Dequantization adds the same offset term to every row's dot product
+        dots += float(self._offset @ q + 128.0 * weights.sum())
+        if space == "l2":
+            # ||x - q||^2 = ||x||^2 - 2 x.q + ||q||^2
+            scores = 2.0 * dots - sq_norms
+        elif space == "cosine":
+            scores = dots / np.sqrt(np.maximum(sq_norms, 1e-12))
+        else:
+            scores = dots
+
+        n = min(n, len(scores))
+        top = np.argpartition(-scores, n - 1)[:n]
+        top = top[np.argsort(-scores[top])]
+        if rows is not None:
+            top = rows[top]
+        return [self._ids[i] for i in top]
+
+    def _scan(self, weights: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        # A full scan runs over the zero padding too and trims afterwards
+        total = _pad_up(self._size, self.COLUMN_PAD) if rows is None else len(rows)
+        out = np.empty(total, dtype=np.float32)
+        for start in range(0, total, self.SCAN_BLOCK):
+            stop = min(start + self.SCAN_BLOCK, total)
+            if rows is None:
+                block = self._codes[:, start:stop]
+            else:
+                block = self._codes[:, rows[start:stop]]
+            out[start:start + block.shape[1]] = weights @ block.astype(np.float32)
+        return out[:self._size] if rows is None else out
@@ -0,0 +1,164 @@
+"""LRU + TTL cache of vector-store query results with near-duplicate lookup."""
+
+import copy
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class QueryCache:
+    """
+    Thread-safe cache of single-query Chroma results.
+
+    Entries are keyed by the query parameters (n_results, where, include)
+    plus a float16 rendering of the query embedding, so a repeated query
+    is an exact dict hit. Near-duplicate queries (cosine similarity of at
+    least `similarity` to a cached embedding, same parameters) are found
+    with one matrix-vector product over the unit embeddings of all cached
+    entries, which live in a fixed (max_size, D) matrix.
+
+    The least recently used entry is evicted when the cache is full, and
+    entries older than `ttl_seconds` are never returned. Callers must
+    clear() the cache whenever the collection changes, and pass put() the
+    generation they read before querying the collection, so a result
+    computed before a write is not cached after it.
+    """
+
+    def __init__(self, max_size: int = 256, ttl_seconds: float = 300.0, similarity: float = 0.97):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.similarity = similarity
+        self._lock = threading.RLock()
+        # exact key -> (slot, params key, result, inserted at); order is LRU first
+        self._entries: "OrderedDict[Tuple, Tuple[int, Tuple, Dict[str, Any], float]]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None  # (max_size, D) unit embeddings
+        self._slot_keys: List[Optional[Tuple]] = []  # exact key per matrix row
+        self._free_slots: List[int] = []
+        self._generation = 0  # Bumped by every clear()
+        self._stats = {"hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0, "stale_puts": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    @staticmethod
+    def params_key(n_results: int, where: Optional[Dict[str, Any]], include: List[str]) -> Tuple:
+        filters = json.dumps(where, sort_keys=True, default=str) if where else ""
+        return (n_results, filters, tuple(include))
+
+    def get(self, embedding: np.ndarray, params: Tuple) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached result for this (or a near-duplicate) query."""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            key = self._exact_key(embedding, params)
+            entry = self._entries.get(key)
+            if entry is not None and self._fresh(entry):
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return copy.deepcopy(entry[2])
+
+            key = self._semantic_match(embedding, params)
+            if key is not None:
+                self._entries.move_to_end(key)
+                self._stats["semantic_hits"] += 1
+                return copy.deepcopy(self._entries[key][2])
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, embedding: np.ndarray, params: Tuple, result: Dict[str, Any], generation: Optional[int] = None) -> None:
+        """Cache a result, unless the cache was cleared since `generation` was read."""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                self._stats["stale_puts"] += 1
+                return
+            unit = self._unit(embedding)
+            if self._matrix is None or self._matrix.shape[1] != unit.shape[0]:
+                # First entry, or the embedding provider changed dimension
+                self._reset(unit.shape[0])
+
+            key = self._exact_key(embedding, params)
+            if key in self._entries:
+                self._drop(key)
+            elif len(self._entries) >= self.max_size:
+                self._drop(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+            slot = self._free_slots.pop()
+            self._matrix[slot] = unit
+            self._slot_keys[slot] = key
+            self._entries[key] = (slot, params, copy.deepcopy(result), time.monotonic())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._matrix = None
+            self._slot_keys = []
+            self._free_slots = []
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["semantic_hits"] + self._stats["misses"]
+            hits = self._stats["hits"] + self._stats["semantic_hits"]
+            return {
+                **self._stats,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hit_rate": hits / lookups if lookups else 0.0,
+            }
+
+    def _reset(self, dimension: int) -> None:
+        self._entries.clear()
+        self._matrix = np.zeros((self.max_size, dimension), dtype=np.float32)
+        self._slot_keys = [None] * self.max_size
+        self._free_slots = list(range(self.max_size - 1, -1, -1))
+
+    def _drop(self, key: Tuple) -> None:
+        slot = self._entries.pop(key)[0]
+        self._slot_keys[slot] = None
+        self._matrix[slot] = 0.0
+        self._free_slots.append(slot)
+
+    def _fresh(self, entry: Tuple) -> bool:
+        return time.monotonic() - entry[3] <= self.ttl_seconds
+
+    def _semantic_match(self, embedding: np.ndarray, params: Tuple) -> Optional[Tuple]:
+        unit = self._unit(embedding)
+        if not self._entries or self._matrix.shape[1] != unit.shape[0]:
+            return None
+
+        sims = self._matrix @ unit
+        candidates = np.flatnonzero(sims >= self.similarity)
+        for slot in candidates[np.argsort(-sims[candidates])]:
+            key = self._slot_keys[slot]
+            if key is None:
+                continue
+            entry = self._entries[key]
+            if entry[1] == params and self._fresh(entry):
+                return key
+        return None
+
+    @staticmethod
+    def _exact_key(embedding: np.ndarray, params: Tuple) -> Tuple:
+        return (np.asarray(embedding, dtype=np.float16).tobytes(), params)
+
+    @staticmethod
+    def _unit(embedding: np.ndarray) -> np.ndarray:
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
@@ -1,7 +1,10 @@
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+from typing import List, Dict, Any, Optional, Tuple
 import time
 
+import numpy as np
 from rank_bm25 import BM25Okapi
 from ..config import settings
 from ..models.search import SearchResult, SearchResponse
@@ -11,6 +14,72 @@ from .vector_store import get_vector_store
 logger = logging.getLogger(__name__)
 
 
+class _QueryEmbeddingBatcher:
+    """
+    Coalesces concurrent single-query embed calls into one embed_batch call.
+    
+    Callers enqueue their query and await a future; a background task drains
+    the queue (up to max_batch items, waiting at most window_ms for more) and
+    resolves every future from a single provider call run off the event loop.
+    """
+    
+    def __init__(self, provider, max_batch: int, window_ms: float):
+        self.provider = provider
+        self.max_batch = max(1, max_batch)
+        self.window = max(0.0, window_ms) / 1000
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+    
+    async def embed(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            # (Re)start the worker on the current loop
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+        
+        future = loop.create_future()
+        self._queue.put_nowait((text, future))
+        return await future
+    
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        queue = self._queue
+        
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                if not queue.empty():
+                    batch.append(queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            
+            texts = [text for text, _ in batch]
+            try:
+                if len(texts) == 1:
+                    vectors = [await loop.run_in_executor(None, self.provider.embed, texts[0])]
+                else:
+                    vectors = await loop.run_in_executor(None, self.provider.embed_batch, texts)
+                    logger.debug(f"Embedded {len(texts)} concurrent queries in one batch")
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+
 class SearchService:
     """
     Service for executing search queries against the knowledge base.
@@ -19,6 +88,11 @@ class SearchService:
     def __init__(self):
         self.vector_store = get_vector_store()
         self.embedding_provider = get_embedding_provider()
+        self._embed_batcher = _QueryEmbeddingBatcher(
+            self.embedding_provider,
+            max_batch=settings.query_embed_batch_size,
+            window_ms=settings.query_embed_batch_window_ms,
+        )
         
         # BM25 Index (In-memory cache)
         # In a production system, this would be Elasticsearch/Solr
@@ -26,6 +100,18 @@ class SearchService:
         self._bm25 = None
         self._bm25_doc_ids = []  # Map index -> chunk_id
         self._bm25_corpus = []   # Tokenized corpus
+        self._bm25_docs = []     # Raw chunk text, parallel to _bm25_doc_ids
+        self._bm25_metas = []    # Chunk metadata, parallel to _bm25_doc_ids
+        self._bm25_id_to_idx: Dict[str, int] = {}
+        # vector_store.write_count the corpus was read at; any write makes it stale
+        self._bm25_write_count = -1
+        # Term-major (CSR) postings built from the BM25Okapi statistics:
+        # term id t owns _bm25_postings[_bm25_indptr[t]:_bm25_indptr[t + 1]]
+        self._vocab: Dict[str, int] = {}
+        self._bm25_idf = np.zeros(0)
+        self._bm25_indptr = np.zeros(1, dtype=np.int64)
+        self._bm25_postings = np.zeros(0, dtype=np.int32)  # Doc index per posting
+        self._bm25_weights = np.zeros(0)  # Length-normalized tf part of BM25 per posting
         self._last_index_update = 0
     
     async def semantic_search(
@@ -36,9 +122,159 @@ class SearchService:
         filter_metadata: Optional[Dict[str, Any]] = None,
     ) -> SearchResponse:
         start_time = time.time()
+        query_vector = await self._embed_query(query)
+        return self._semantic_search_vec(query, query_vector, top_k, score_threshold, filter_metadata, start_time)
+
+    def _semantic_search_vec(
+        self,
+        query: str,
+        query_vector: List[float],
+        top_k: int,
+        score_threshold: float = 0.0,
+        filter_metadata: Optional[Dict[str, Any]] = None,
+        start_time: Optional[float] = None,
+    ) -> SearchResponse:
+        """Semantic search for an already-embedded query (start_time lets callers include embedding time)."""
+        start_time = start_time or time.time()
+        
+        results = self._vector_query([query_vector], top_k, filter_metadata)
+        
+        search_results = self._build_results(results, 0, score_threshold)
         
+        elapsed_ms = (time.time() - start_time) * 1000
+        logger.info(f"Semantic search found {len(search_results)} results in {elapsed_ms:.2f}ms")
+        
+        response = SearchResponse(
+            query=query,
+            results=search_results,
+            total_results=len(search_results),
+            search_time_ms=elapsed_ms
+        )
+        return response
+
+    async def batch_semantic_search(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        score_threshold: float = 0.0,
+        filter_metadata: Optional[Dict[str, Any]] = None,
+    ) -> List[SearchResponse]:
+        """
+        Run several semantic searches (e.g. sub-queries or HyDE rewrites) at once.
+        
+        Queries are embedded concurrently (so the embed batcher coalesces them)
+        and every cache miss goes to the vector store in a single batched ANN
+        call. Returns one SearchResponse per query, in input order.
+        """
+        if not queries:
+            return []
+        start_time = time.time()
+        
+        query_vectors = await asyncio.gather(*(self._embed_query(q) for q in queries))
+        
+        # The vector store answers repeated queries from its cache and sends
+        # the rest to Chroma as one batch
+        results = self._vector_query(list(query_vectors), top_k, filter_metadata)
+        
+        elapsed_ms = (time.time() - start_time) * 1000
+        logger.info(f"Batch semantic search ran {len(queries)} queries in {elapsed_ms:.2f}ms")
+        
+        responses = []
+        for i, query in enumerate(queries):
+            search_results = self._build_results(results, i, score_threshold)
+            responses.append(SearchResponse(
+                query=query,
+                results=search_results,
+                total_results=len(search_results),
+                search_time_ms=elapsed_ms,
+            ))
+        return responses
+
+    async def hybrid_search(
+        self,
+        query: str,
+        top_k: int = 5,
+        semantic_weight: float = 0.7,
+        filter_metadata: Optional[Dict[str, Any]] = None,
+    ) -> SearchResponse:
+        start_time = time.time()
+        
+        candidate_k = top_k * 2
+        
+        # Embed once; any further semantic stage should reuse query_vector
+        query_vector = await self._embed_query(query)
+        semantic_response = self._semantic_search_vec(
+            query=query,
+            query_vector=query_vector,
+            top_k=candidate_k,
+            filter_metadata=filter_metadata,
+        )
+        
+        keyword_results = self._keyword_search_bm25(
+            query=query,
+            top_k=candidate_k
+        )
+        
+        # Candidates live in parallel lists indexed by position; id_to_idx is
+        # only consulted while merging the keyword hits
+        ids = [res.chunk_id for res in semantic_response.results]
+        result_objs: List[Optional[SearchResult]] = list(semantic_response.results)
+        sem_scores = [res.score for res in semantic_response.results]
+        key_scores = [0.0] * len(ids)
+        id_to_idx = {chunk_id: i for i, chunk_id in enumerate(ids)}
+        
+        missing_ids = []
+        for chunk_id, keyword_score in keyword_results:
+            idx = id_to_idx.get(chunk_id)
+            if idx is None:
+                idx = id_to_idx[chunk_id] = len(ids)
+                ids.append(chunk_id)
+                result_objs.append(None)
+                sem_scores.append(0.0)
+                key_scores.append(0.0)
+                missing_ids.append(chunk_id)
+            key_scores[idx] = keyword_score
+        
+        if missing_ids:
+            fetched_docs = self._fetch_documents(missing_ids)
+            for doc in fetched_docs:
+                result_objs[id_to_idx[doc.chunk_id]] = doc
+        
+        sem = np.asarray(sem_scores)
+        key = np.asarray(key_scores)
+        final = sem * semantic_weight + key * (1.0 - semantic_weight)
+        
+        # Candidates whose document could not be fetched are dropped
+        present = np.flatnonzero([obj is not None for obj in result_objs])
+        k = min(top_k, len(present))
+        top = present[np.argpartition(-final[present], k - 1)[:k]] if k > 0 else present
+        top = top[np.argsort(-final[top], kind="stable")]
+        
+        top_results = []
+        for idx in top:
+            result_obj = result_objs[idx]
+            result_obj.score = float(final[idx])
+            result_obj.metadata["_debug_score"] = {
+                "semantic": float(sem[idx]),
+                "keyword": float(key[idx]),
+                "combined": float(final[idx])
+            }
+            top_results.append(result_obj)
+        
+        elapsed_ms = (time.time() - start_time) * 1000
+        logger.info(f"Hybrid search combined {len(ids)} candidates into {len(top_results)} results in {elapsed_ms:.2f}ms")
+        
+        return SearchResponse(
+            query=query,
+            results=top_results,
+            total_results=len(top_results),
+            search_time_ms=elapsed_ms
+        )
+
+    async def _embed_query(self, query: str) -> List[float]:
+        """Embed a query, falling back to local embeddings on an OpenAI quota error."""
         try:
-            query_vector = self.embedding_provider.embed(query)
+            return await self._batched_embed(query)
         except ValueError as e:
             # Check if it's a quota error - try fallback to local
             error_str = str(e)
@@ -66,6 +302,7 @@ class SearchService:
                     local_provider = get_local_embedding_provider()
                     query_vector = local_provider.embed(query)
                     logger.info("Successfully used local embeddings as fallback")
+                    return query_vector
                 except Exception as fallback_error:
                     logger.error(f"Fallback to local embeddings also failed: {fallback_error}")
                     raise ValueError(f"Embedding generation failed. OpenAI quota exceeded and local fallback failed: {fallback_error}")
@@ -75,10 +312,16 @@ class SearchService:
         except Exception as e:
             logger.error(f"Failed to embed query: {e}")
             raise ValueError(f"Embedding generation failed: {e}")
-        
+
+    def _vector_query(
+        self,
+        query_vectors: List[List[float]],
+        top_k: int,
+        filter_metadata: Optional[Dict[str, Any]],
+    ) -> Dict[str, Any]:
         try:
-            results = self.vector_store.query(
-                query_embedding=query_vector,
+            return self.vector_store.batch_query(
+                query_embeddings=query_vectors,
                 n_results=top_k,
                 where=filter_metadata,
             )
@@ -96,168 +339,78 @@ class SearchService:
         except Exception as e:
             logger.error(f"ChromaDB query failed: {e}")
             raise ValueError(f"Vector search failed: {e}")
-        
-        search_results = []
-        
-        if results and results['ids'] and results['ids'][0]:
-            ids = results['ids'][0]
-            distances = results['distances'][0]
-            metadatas = results['metadatas'][0]
-            documents = results['documents'][0]
-            
-            for i in range(len(ids)):
-                score = 1 / (1 + distances[i])
-                
-                if score < score_threshold:
-                    continue
-                
-                metadata = metadatas[i] or {}
-                
-                search_results.append(SearchResult(
-                    chunk_id=ids[i],
-                    document_id=metadata.get('document_id', 'unknown'),
-                    filename=metadata.get('filename', 'unknown'),
-                    content=documents[i],
-                    score=score,
-                    chunk_index=metadata.get('chunk_index', 0),
-                    metadata=metadata,
-                ))
-        
-        elapsed_ms = (time.time() - start_time) * 1000
-        logger.info(f"Semantic search found {len(search_results)} results in {elapsed_ms:.2f}ms")
-        
-        return SearchResponse(
-            query=query,
-            results=search_results,
-            total_results=len(search_results),
-            search_time_ms=elapsed_ms
-        )
 
-    async def hybrid_search(
-        self,
-        query: str,
-        top_k: int = 5,
-        semantic_weight: float = 0.7,
-        filter_metadata: Optional[Dict[str, Any]] = None,
-    ) -> SearchResponse:
-        start_time = time.time()
-        
-        candidate_k = top_k * 2
-        
-        semantic_response = await self.semantic_search(
-            query=query,
-            top_k=candidate_k,
-            filter_metadata=filter_metadata
-        )
-        
-        keyword_results = self._keyword_search_bm25(
-            query=query,
-            top_k=candidate_k
-        )
-        
-        merged_results = {}
-        
-        for res in semantic_response.results:
-            merged_results[res.chunk_id] = {
-                "semantic_score": res.score,
-                "keyword_score": 0.0,
-                "result": res
-            }
-            
-        missing_ids = []
-        for res in keyword_results:
-            if res.chunk_id in merged_results:
-                merged_results[res.chunk_id]["keyword_score"] = res.score
-            else:
-                merged_results[res.chunk_id] = {
-                    "semantic_score": 0.0,
-                    "keyword_score": res.score,
-                    "result": None
-                }
-                missing_ids.append(res.chunk_id)
-        
-        if missing_ids:
-            fetched_docs = self._fetch_documents(missing_ids)
-            for doc in fetched_docs:
-                merged_results[doc.chunk_id]["result"] = doc
-        
-        final_results = []
-        
-        for chunk_id, data in merged_results.items():
-            result_obj = data["result"]
-            if not result_obj:
-                continue
-                
-            sem_score = data["semantic_score"]
-            key_score = data["keyword_score"]
-            
-            final_score = (sem_score * semantic_weight) + (key_score * (1.0 - semantic_weight))
-            
-            result_obj.score = final_score
-            result_obj.metadata["_debug_score"] = {
-                "semantic": sem_score,
-                "keyword": key_score,
-                "combined": final_score
-            }
-            
-            final_results.append(result_obj)
-            
-        final_results.sort(key=lambda x: x.score, reverse=True)
-        top_results = final_results[:top_k]
-        
-        elapsed_ms = (time.time() - start_time) * 1000
-        logger.info(f"Hybrid search combined {len(merged_results)} candidates into {len(top_results)} results in {elapsed_ms:.2f}ms")
-        
-        return SearchResponse(
-            query=query,
-            results=top_results,
-            total_results=len(top_results),
-            search_time_ms=elapsed_ms
-        )
+    def _build_results(self, results: Dict[str, Any], index: int, score_threshold: float) -> List[SearchResult]:
+        """Turn the index-th query's Chroma result lists into SearchResults."""
+        if not results or not results['ids'] or not results['ids'][index]:
+            return []
+        # Scores are 1 / (1 + squared L2 distance). On unit vectors the "ip"
+        # distance (1 - cos) is half of that, so both spaces score alike
+        to_l2 = 2.0 if self.vector_store.space == "ip" else 1.0
+        return [
+            SearchResult(
+                chunk_id=chunk_id,
+                document_id=metadata.get('document_id', 'unknown'),
+                filename=metadata.get('filename', 'unknown'),
+                content=document,
+                score=score,
+                chunk_index=metadata.get('chunk_index', 0),
+                metadata=metadata,
+            )
+            for chunk_id, distance, metadata, document in zip(
+                results['ids'][index],
+                results['distances'][index],
+                (m or {} for m in results['metadatas'][index]),
+                results['documents'][index],
+            )
+            for score in (1 / (1 + to_l2 * distance),)
+            if score >= score_threshold
+        ]
+
+    async def _batched_embed(self, query: str) -> List[float]:
+        return await self._embed_batcher.embed(query)
 
     def _tokenize(self, text: str) -> List[str]:
         import re
         text = re.sub(r'[^a-zA-Z0-9\s]', '', text)
         return text.lower().split()
 
-    def _keyword_search_bm25(self, query: str, top_k: int) -> List[SearchResult]:
+    def _keyword_search_bm25(self, query: str, top_k: int) -> List[Tuple[str, float]]:
+        """Return (chunk_id, normalized score) pairs for the best BM25 matches."""
         self._ensure_bm25_index()
         
         if not self._bm25 or not self._bm25_doc_ids:
             return []
             
-        tokenized_query = self._tokenize(query)
-        scores = self._bm25.get_scores(tokenized_query)
-        top_indices = scores.argsort()[::-1][:top_k]
-        
-        results = []
-        for idx in top_indices:
-            score = scores[idx]
-            if score <= 0:
-                continue
-                
-            chunk_id = self._bm25_doc_ids[idx]
-            
-            results.append(SearchResult(
-                chunk_id=chunk_id,
-                document_id="unknown",
-                filename="unknown",
-                content="",
-                score=self._normalize_bm25_score(score),
-                chunk_index=0,
-                metadata={}
-            ))
-            
-        return results
+        scores = self._bm25_scores(self._tokenize_query_ids(query))
+        
+        # Partial selection is O(N); only the top_k slice gets sorted
+        k = min(top_k, len(scores))
+        if k <= 0:
+            return []
+        top_indices = np.argpartition(-scores, k - 1)[:k]
+        top_indices = top_indices[np.argsort(-scores[top_indices])]
+        
+        top_indices = top_indices[scores[top_indices] > 0]
+        normalized = self._normalize_bm25_score(scores[top_indices])
+        
+        return [(self._bm25_doc_ids[idx], float(score)) for idx, score in zip(top_indices, normalized)]
+
+    def _bm25_current(self) -> bool:
+        return self._bm25 is not None and self._bm25_write_count == self.vector_store.write_count
 
     def _ensure_bm25_index(self):
-        if self._bm25 is not None:
+        if self._bm25_current():
             return
 
         logger.info("Building BM25 index...")
         
+        # Read first, so a write during the build leaves the snapshot stale
+        write_count = self.vector_store.write_count
+        self._bm25 = None
+        self._bm25_id_to_idx = {}
         try:
-            all_docs = self.vector_store.get_all_documents(limit=10000)
+            all_docs = self.vector_store.get_all_documents(limit=10000, include=["documents", "metadatas"])
             
             if not all_docs or not all_docs['ids']:
                 logger.warning("No documents to index for BM25")
@@ -265,28 +418,95 @@ class SearchService:
 
             self._bm25_doc_ids = all_docs['ids']
             documents = all_docs['documents']
+            # Keep text and metadata so keyword-only hits need no extra Chroma fetch
+            self._bm25_docs = documents
+            self._bm25_metas = all_docs['metadatas'] or [None] * len(documents)
+            self._bm25_id_to_idx = {cid: i for i, cid in enumerate(self._bm25_doc_ids)}
             self._bm25_corpus = [self._tokenize(doc) for doc in documents]
             self._bm25 = BM25Okapi(self._bm25_corpus)
+            self._build_bm25_postings(self._bm25)
+            self._bm25_write_count = write_count
             logger.info(f"BM25 index built with {len(self._bm25_doc_ids)} chunks")
             
         except Exception as e:
             logger.error(f"Failed to build BM25 index: {e}")
             self._bm25 = None
 
-    def _normalize_bm25_score(self, score: float) -> float:
-        return 1.0 - (1.0 / (1.0 + score * 0.1))
+    def _build_bm25_postings(self, bm25: BM25Okapi) -> None:
+        """Flatten BM25Okapi's per-document term dicts into integer-keyed CSR postings."""
+        vocab: Dict[str, int] = {}
+        term_ids, doc_ids, tfs = [], [], []
+        for doc_idx, freqs in enumerate(bm25.doc_freqs):
+            for term, tf in freqs.items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                doc_ids.append(doc_idx)
+                tfs.append(tf)
+        
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        order = np.argsort(term_ids, kind="stable")
+        tf = np.asarray(tfs, dtype=np.float64)[order]
+        doc_len = np.asarray(bm25.doc_len, dtype=np.float64)
+        postings = np.asarray(doc_ids, dtype=np.int32)[order]
+        
+        # Same formula as BM25Okapi.get_scores, with everything but idf precomputed
+        norm = bm25.k1 * (1 - bm25.b + bm25.b * doc_len[postings] / bm25.avgdl)
+        self._bm25_weights = tf * (bm25.k1 + 1) / (tf + norm)
+        self._bm25_postings = postings
+        self._bm25_indptr = np.concatenate(([0], np.cumsum(np.bincount(term_ids, minlength=len(vocab)))))
+        self._bm25_idf = np.array([bm25.idf[term] for term in vocab], dtype=np.float64)
+        self._vocab = vocab
+
+    def _tokenize_query_ids(self, query: str) -> np.ndarray:
+        """Map query tokens to vocabulary ids, dropping unknown terms (they score 0)."""
+        ids = (self._vocab.get(token, -1) for token in self._tokenize(query))
+        return np.array([i for i in ids if i >= 0], dtype=np.int32)
+
+    def _bm25_scores(self, term_ids: np.ndarray) -> np.ndarray:
+        """BM25 score of every chunk; only the postings of the query terms are touched."""
+        scores = np.zeros(len(self._bm25_doc_ids))
+        # Repeated query terms count once per occurrence, as in get_scores
+        for term_id in term_ids:
+            lo, hi = self._bm25_indptr[term_id], self._bm25_indptr[term_id + 1]
+            scores[self._bm25_postings[lo:hi]] += self._bm25_idf[term_id] * self._bm25_weights[lo:hi]
+        return scores
+
+    def _normalize_bm25_score(self, scores: np.ndarray) -> np.ndarray:
+        return 1.0 - (1.0 / (1.0 + scores * 0.1))
 
     def _fetch_documents(self, chunk_ids: List[str]) -> List[SearchResult]:
         if not chunk_ids:
             return []
+        
+        # Serve from the in-memory BM25 corpus while no write has happened since
+        # it was read; otherwise (and for ids it lacks) go to Chroma
+        id_to_idx = self._bm25_id_to_idx if self._bm25_current() else {}
+        fetched = []
+        remaining = []
+        for cid in chunk_ids:
+            idx = id_to_idx.get(cid)
+            if idx is None:
+                remaining.append(cid)
+                continue
+            meta = self._bm25_metas[idx] or {}
+            fetched.append(SearchResult(
+                chunk_id=cid,
+                document_id=meta.get('document_id', 'unknown'),
+                filename=meta.get('filename', 'unknown'),
+                content=self._bm25_docs[idx],
+                score=0.0, # Will be set by caller
+                chunk_index=meta.get('chunk_index', 0),
+                metadata=dict(meta)
+            ))
+        
+        if not remaining:
+            return fetched
             
         try:
             results = self.vector_store.collection.get(
-                ids=chunk_ids,
+                ids=remaining,
                 include=["documents", "metadatas"]
             )
             
-            fetched = []
             if results['ids']:
                 for i, cid in enumerate(results['ids']):
                     meta = results['metadatas'][i] or {}
@@ -303,14 +523,17 @@ class SearchService:
             
         except Exception as e:
             logger.error(f"Failed to fetch documents: {e}")
-            return []
+            return fetched
 
 # Singleton
 _search_service: Optional[SearchService] = None
+_search_service_lock = threading.Lock()
 
 def get_search_service() -> SearchService:
     global _search_service
     if _search_service is None:
-        _search_service = SearchService()
+        with _search_service_lock:
+            if _search_service is None:
+                _search_service = SearchService()
     return _search_service
 
@@ -1,16 +1,29 @@
 """ChromaDB Vector Store Service."""
 
+import contextvars
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
 from pathlib import Path
 
 import chromadb
+import numpy as np
 from chromadb.config import Settings as ChromaSettings
 
 from ..config import settings
+from .quantized_index import QuantizedIndex
+from .query_cache import QueryCache
 
 logger = logging.getLogger(__name__)
 
+# Set inside VectorStoreService.bulk_ingest(), for the current task/thread only
+_bulk_ingest_active: contextvars.ContextVar[bool] = contextvars.ContextVar("bulk_ingest_active", default=False)
+
 
 class VectorStoreService:
     """Service for managing ChromaDB vector storage."""
@@ -19,6 +32,22 @@ class VectorStoreService:
         """Initialize ChromaDB client with persistent storage."""
         self._client: Optional[chromadb.PersistentClient] = None
         self._collection: Optional[chromadb.Collection] = None
+        # Writes so far; lets callers tell when data they derived is stale
+        self._write_count = 0
+        # Recent query results; cleared on every write
+        self._cache = QueryCache(
+            max_size=settings.search_cache_size,
+            ttl_seconds=settings.search_cache_ttl_seconds,
+            similarity=settings.search_cache_similarity,
+        )
+        # Embedding dimension of the stored vectors (None while the collection is empty)
+        self._dimension: Optional[int] = None
+        # Bulk imports running anywhere in the process (defers index saves)
+        self._bulk_depth = 0
+        self._bulk_lock = threading.Lock()
+        # Optional int8 first-stage index (see QuantizedIndex) and when it was last written
+        self._sq_index: Optional[QuantizedIndex] = None
+        self._sq_saved_at = float("-inf")
     
     def initialize(self) -> None:
         logger.info(f"Initializing ChromaDB at {settings.chroma_dir}")
@@ -41,7 +70,7 @@ class VectorStoreService:
                 
                 # Detect dimension from existing collection
                 if existing_count > 0:
-                    existing_dim = self.get_collection_dimension()
+                    existing_dim = self.get_collection_dimension(existing_collection)
                     current_dim = settings.embedding_dimension
                     
                     if existing_dim and existing_dim != current_dim:
@@ -63,6 +92,7 @@ class VectorStoreService:
                         )
                     elif existing_dim:
                         logger.info(f"Collection dimension verified: {existing_dim} (matches current settings)")
+                    self._dimension = existing_dim
                 
                 # Collection exists and dimension matches (or is empty)
                 self._collection = existing_collection
@@ -75,12 +105,15 @@ class VectorStoreService:
                         metadata={
                             "description": "Personal Knowledge Engine document embeddings",
                             "embedding_dimension": settings.embedding_dimension,
+                            "hnsw:space": "ip",
                         }
                     )
                 else:
                     raise
             
             count = self._collection.count()
+            if settings.quantized_index_enabled:
+                self._init_quantized_index(count)
             logger.info(f"ChromaDB initialized. Collection '{settings.chroma_collection_name}' ready.")
             logger.info(f"Current document count: {count}")
             logger.info(f"Collection embedding dimension: {settings.embedding_dimension}")
@@ -105,35 +138,181 @@ class VectorStoreService:
             self.initialize()
         return self._collection
     
+    @property
+    def space(self) -> str:
+        """Distance function of the collection ("ip" for collections created by this version, "l2" before)."""
+        return (self.collection.metadata or {}).get("hnsw:space", "l2")
+    
+    @property
+    def write_count(self) -> int:
+        """Number of adds, deletes and resets since startup."""
+        return self._write_count
+    
+    def _collection_changed(self) -> None:
+        """Invalidate state derived from the collection; the last step of every write."""
+        self._write_count += 1
+        self._cache.clear()
+    
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.clip(norms, 1e-12, None)
+    
     def add_documents(
         self,
         ids: List[str],
-        embeddings: List[List[float]],
+        embeddings: Union[List[List[float]], np.ndarray],
         documents: List[str],
         metadatas: Optional[List[Dict[str, Any]]] = None,
+        batch_size: int = 200,
     ) -> None:
-        """Add documents with embeddings to the collection."""
-        self.collection.add(
-            ids=ids,
-            embeddings=embeddings,
-            documents=documents,
-            metadatas=metadatas or [{}] * len(ids),
-        )
+        """Add documents with embeddings to the collection, batch_size rows per Chroma call."""
+        metadatas = metadatas or [{}] * len(ids)
+        if self.space == "ip":
+            # Inner product equals cosine similarity only on unit vectors
+            embeddings = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        # Chroma ingests fastest in batches of a few hundred rows; a numpy
+        # (N, D) array is sliced and passed through without list conversion
+        batch_size = max(1, batch_size)
+        with self._relaxed_durability():
+            for start in range(0, len(ids), batch_size):
+                stop = start + batch_size
+                self.collection.add(
+                    ids=ids[start:stop],
+                    embeddings=embeddings[start:stop],
+                    documents=documents[start:stop],
+                    metadatas=metadatas[start:stop],
+                )
+        if len(embeddings) > 0:
+            self._dimension = len(embeddings[0])
+        if self._sq_index is not None:
+            self._sq_index.add(ids, embeddings)
+            self._save_sq_index()
+        # Last, once every index the query path reads has the new rows
+        self._collection_changed()
         logger.info(f"Added {len(ids)} documents to collection")
     
+    def add_documents_streaming(
+        self,
+        records: Iterable[Tuple[str, str, Dict[str, Any]]],
+        embed_fn: Callable[[List[str]], Any],
+        insert_batch: int = 200,
+        workers: int = 1,
+    ) -> int:
+        """
+        Embed and store (id, document, metadata) records as a pipeline.
+        
+        The calling thread embeds the next batch while worker threads insert
+        the previous ones; at most 2 * workers embedded batches wait for
+        insertion, so a slow store holds the embedder back instead of
+        buffering the whole input. Returns the number of records added.
+        """
+        workers = max(1, workers)
+        records = iter(records)
+        pending = deque()
+        added = 0
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chroma-insert") as pool:
+            while True:
+                batch = list(islice(records, insert_batch))
+                if not batch:
+                    break
+                ids, documents, metadatas = (list(column) for column in zip(*batch))
+                embeddings = embed_fn(documents)
+                # Workers run in the caller's context, so they see bulk_ingest()
+                pending.append(pool.submit(
+                    contextvars.copy_context().run,
+                    self._add_batch, ids, embeddings, documents, metadatas, insert_batch,
+                ))
+                if len(pending) >= 2 * workers:
+                    added += pending.popleft().result()
+            while pending:
+                added += pending.popleft().result()
+        
+        logger.info(f"Streamed {added} documents into collection")
+        return added
+    
+    def _add_batch(self, ids, embeddings, documents, metadatas, batch_size: int) -> int:
+        self.add_documents(ids, embeddings, documents, metadatas, batch_size=batch_size)
+        return len(ids)
+    
     def query(
         self,
-        query_embedding: List[float],
+        query_embeddings: Union[List[float], List[List[float]]],
         n_results: int = 5,
         where: Optional[Dict[str, Any]] = None,
         include: Optional[List[str]] = None,
     ) -> Dict[str, Any]:
-        """Query the collection for similar documents."""
+        """Query the collection for similar documents (one result list per query embedding)."""
         include = include or ["documents", "metadatas", "distances"]
+        # One contiguous float32 (K, D) block, which Chroma takes without re-casting;
+        # a single embedding is treated as a batch of one
+        queries = np.ascontiguousarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries.reshape(1, -1)
+        if self.space == "ip":
+            queries = self._normalize(queries)
+        if self._dimension and queries.shape[1] != self._dimension:
+            raise self._dimension_mismatch_error(str(self._dimension), queries.shape[1])
+        
+        if not self._cache.enabled:
+            return self._query_uncached(queries, n_results, where, include)
+        
+        # Serve what we can from the cache; the misses go to the index in one batch
+        params = QueryCache.params_key(n_results, where, include)
+        per_query = [self._cache.get(q, params) for q in queries]
+        misses = [i for i, cached in enumerate(per_query) if cached is None]
+        if misses:
+            # Read before querying: a write landing meanwhile makes put() a no-op
+            generation = self._cache.generation
+            fresh = self._query_uncached(queries[misses], n_results, where, include)
+            for batch_idx, i in enumerate(misses):
+                per_query[i] = {
+                    field: values[batch_idx] if isinstance(values, list) else None
+                    for field, values in fresh.items()
+                }
+                self._cache.put(queries[i], params, per_query[i], generation)
+        
+        fields = dict.fromkeys(field for result in per_query for field in result)
+        return {
+            field: [result[field] for result in per_query]
+            if all(result.get(field) is not None for result in per_query) else None
+            for field in fields
+        }
+    
+    def batch_query(
+        self,
+        query_embeddings: Union[List[List[float]], np.ndarray],
+        n_results: int = 5,
+        where: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Query with several embeddings at once (query expansion, HyDE rewrites).
+        
+        Cached queries are answered immediately and all misses go to Chroma
+        in one multi-query call; results are in input order.
+        """
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim != 2:
+            raise ValueError(f"batch_query expects a (K, D) batch of embeddings, got shape {queries.shape}")
+        return self.query(queries, n_results=n_results, where=where, include=include)
+    
+    def _query_uncached(
+        self,
+        queries: np.ndarray,
+        n_results: int,
+        where: Optional[Dict[str, Any]],
+        include: List[str],
+    ) -> Dict[str, Any]:
+        if self._sq_index is not None and where is None and len(self._sq_index) > 0:
+            try:
+                return self._two_stage_query(queries, n_results, include)
+            except Exception as e:
+                logger.warning(f"Quantized index query failed, falling back to Chroma: {e}")
         
         try:
             results = self.collection.query(
-                query_embeddings=[query_embedding],
+                query_embeddings=queries,
                 n_results=n_results,
                 where=where,
                 include=include,
@@ -147,44 +326,153 @@ class VectorStoreService:
                 import re
                 dim_match = re.search(r'(\d+)', error_str)
                 expected_dim = dim_match.group(1) if dim_match else None
-                actual_dim = len(query_embedding)
                 
                 # Try to detect actual collection dimension
                 collection_dim = self.get_collection_dimension()
                 if collection_dim:
                     expected_dim = str(collection_dim)
                 
-                logger.error(
-                    f"Dimension mismatch: Collection expects {expected_dim} dimensions, "
-                    f"but got {actual_dim}. This usually happens when switching embedding providers. "
-                    f"Please reset the collection or use the matching embedding provider."
-                )
-                
-                # Provide helpful guidance based on dimensions
-                guidance = ""
-                if expected_dim == "3072":
-                    guidance = "The collection uses OpenAI text-embedding-3-large (3072 dims). Switch to OpenAI provider or reset the collection."
-                elif expected_dim == "1536":
-                    guidance = "The collection uses OpenAI text-embedding-3-small or ada-002 (1536 dims). Switch to OpenAI provider or reset the collection."
-                elif expected_dim == "384":
-                    guidance = "The collection uses local embeddings (384 dims). Switch to local provider or reset the collection."
-                
-                raise ValueError(
-                    f"Embedding dimension mismatch: Collection was created with {expected_dim}-dimensional embeddings, "
-                    f"but current provider generates {actual_dim}-dimensional embeddings.\n\n"
-                    f"{guidance}\n\n"
-                    f"To fix this:\n"
-                    f"1. Reset the knowledge base: DELETE http://localhost:8000/api/documents/reset (this will delete all indexed documents)\n"
-                    f"2. Switch to the embedding provider that matches the collection dimension in Settings\n"
-                    f"3. Re-index all documents with the current provider"
-                )
+                raise self._dimension_mismatch_error(expected_dim, queries.shape[1])
             raise
     
-    def get_collection_dimension(self) -> Optional[int]:
+    def _dimension_mismatch_error(self, expected_dim: Optional[str], actual_dim: int) -> ValueError:
+        logger.error(
+            f"Dimension mismatch: Collection expects {expected_dim} dimensions, "
+            f"but got {actual_dim}. This usually happens when switching embedding providers. "
+            f"Please reset the collection or use the matching embedding provider."
+        )
+        
+        # Provide helpful guidance based on dimensions
+        guidance = ""
+        if expected_dim == "3072":
+            guidance = "The collection uses OpenAI text-embedding-3-large (3072 dims). Switch to OpenAI provider or reset the collection."
+        elif expected_dim == "1536":
+            guidance = "The collection uses OpenAI text-embedding-3-small or ada-002 (1536 dims). Switch to OpenAI provider or reset the collection."
+        elif expected_dim == "384":
+            guidance = "The collection uses local embeddings (384 dims). Switch to local provider or reset the collection."
+        
+        return ValueError(
+            f"Embedding dimension mismatch: Collection was created with {expected_dim}-dimensional embeddings, "
+            f"but current provider generates {actual_dim}-dimensional embeddings.\n\n"
+            f"{guidance}\n\n"
+            f"To fix this:\n"
+            f"1. Reset the knowledge base: DELETE http://localhost:8000/api/documents/reset (this will delete all indexed documents)\n"
+            f"2. Switch to the embedding provider that matches the collection dimension in Settings\n"
+            f"3. Re-index all documents with the current provider"
+        )
+    
+    def _init_quantized_index(self, count: int) -> None:
+        """Load the int8 sidecar index, rebuilding it from Chroma if it is out of sync."""
+        self._sq_index = QuantizedIndex(
+            settings.chroma_dir,
+            nprobe=settings.quantized_index_nprobe,
+            pca_components=settings.quantized_index_pca_components,
+            dtype=settings.quantized_index_dtype,
+        )
+        if self._sq_index.load() and len(self._sq_index) == count:
+            return
+        
+        logger.info(f"Rebuilding quantized index from {count} stored embeddings")
+        self._sq_index.clear()
+        page_size = 1000
+        for offset in range(0, count, page_size):
+            page = self._collection.get(limit=page_size, offset=offset, include=["embeddings"])
+            if page["ids"]:
+                self._sq_index.add(page["ids"], page["embeddings"])
+        self._sq_index.save()
+        self._sq_saved_at = time.monotonic()
+    
+    def _save_sq_index(self, force: bool = False) -> None:
+        """
+        Write the quantized index if it changed. Saves rewrite the whole
+        index, so they are skipped while a bulk import runs (the outermost
+        bulk_ingest() saves on exit) and otherwise made at most once per
+        quantized_index_save_interval_seconds; flush() writes what is left
+        at shutdown. An index that missed its last save is rebuilt from
+        Chroma on the next start, since its size no longer matches.
+        """
+        index = self._sq_index
+        if index is None or not index.dirty:
+            return
+        if not force and (
+            self._bulk_depth > 0
+            or time.monotonic() - self._sq_saved_at < settings.quantized_index_save_interval_seconds
+        ):
+            return
+        index.save()
+        self._sq_saved_at = time.monotonic()
+    
+    def flush(self) -> None:
+        """Persist any deferred state (call on shutdown)."""
+        self._save_sq_index(force=True)
+    
+    def _distances(self, embeddings: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Exact distances in the collection's configured space (Chroma semantics)."""
+        space = self.space
+        if space == "ip":
+            return 1.0 - embeddings @ query
+        if space == "cosine":
+            norms = np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query)
+            return 1.0 - (embeddings @ query) / np.maximum(norms, 1e-12)
+        diff = embeddings - query
+        return np.einsum("nd,nd->n", diff, diff)
+    
+    def _two_stage_query(
+        self,
+        queries: np.ndarray,
+        n_results: int,
+        include: List[str],
+    ) -> Dict[str, Any]:
+        """Pick candidates from the int8 index, then rerank them with fp32 embeddings."""
+        space = self.space
+        n_candidates = n_results * max(1, settings.quantized_index_rerank_factor)
+        candidates = [self._sq_index.search(q, n=n_candidates, space=space) for q in queries]
+        
+        # One fetch for the union of every query's candidates
+        fetched = self.collection.get(
+            ids=list(dict.fromkeys(cid for ids in candidates for cid in ids)),
+            include=["embeddings"] + [f for f in ("documents", "metadatas") if f in include],
+        )
+        
+        # get() does not preserve the requested order
+        row_of = {cid: i for i, cid in enumerate(fetched["ids"])}
+        embeddings = np.asarray(fetched["embeddings"], dtype=np.float32)
+        
+        results: Dict[str, Any] = {"ids": []}
+        for field in ("distances", "documents", "metadatas", "embeddings"):
+            results[field] = [] if field in include else None
+        
+        for q, ids in zip(queries, candidates):
+            rows = np.array([row_of[cid] for cid in ids if cid in row_of], dtype=np.int64)
+            distances = self._distances(embeddings[rows], q)
+            ranked = np.argsort(distances)[:n_results]
+            order = rows[ranked]
+            results["ids"].append([fetched["ids"][i] for i in order])
+            if results["distances"] is not None:
+                results["distances"].append(distances[ranked].tolist())
+            for field in ("documents", "metadatas", "embeddings"):
+                if results[field] is not None:
+                    results[field].append([fetched[field][i] for i in order])
+        return results
+    
+    def get_collection_dimension(self, collection: Optional[chromadb.Collection] = None) -> Optional[int]:
         """Detect the dimension of embeddings in the collection."""
+        # initialize() passes the collection explicitly: going through
+        # self.collection before it is assigned would re-enter initialize()
+        collection = collection or self.collection
+        try:
+            # Chroma records the dimension on the collection row at the first
+            # add, which is one SQLite row instead of decoding a stored vector.
+            # (Our "embedding_dimension" metadata is only the setting at create
+            # time.) Internal API, so fall back to fetching an embedding.
+            rows = self._client._server._sysdb.get_collections(id=collection.id)
+            if rows and rows[0].get("dimension"):
+                return int(rows[0]["dimension"])
+        except Exception as e:
+            logger.debug(f"Collection dimension record unavailable: {e}")
         try:
             # Try to get one document to check its embedding dimension
-            results = self.collection.get(limit=1, include=["embeddings"])
+            results = collection.get(limit=1, include=["embeddings"])
             if results.get("embeddings") and len(results["embeddings"]) > 0:
                 embedding = results["embeddings"][0]
                 if isinstance(embedding, list) and len(embedding) > 0:
@@ -213,38 +501,117 @@ class VectorStoreService:
         """Delete a document by ID."""
         try:
             self.collection.delete(ids=[doc_id])
+            if self._sq_index is not None and self._sq_index.remove([doc_id]):
+                self._save_sq_index()
+            self._collection_changed()
             logger.info(f"Deleted document {doc_id}")
             return True
         except Exception as e:
             logger.error(f"Failed to delete document {doc_id}: {e}")
             return False
     
-    def delete_by_metadata(self, where: Dict[str, Any]) -> int:
+    def delete_by_metadata(self, where: Dict[str, Any], batch_size: int = 500) -> int:
         """Delete documents matching metadata filter."""
-        # Get matching IDs first
-        results = self.collection.get(
-            where=where,
-            include=["metadatas"],
-        )
+        deleted = 0
+        removed_from_index = 0
+        while True:
+            # IDs only (Chroma always returns them), one page at a time; deleted
+            # rows drop out of the filter, so the next page starts at offset 0
+            ids = self.collection.get(where=where, limit=batch_size, include=[])["ids"]
+            if not ids:
+                break
+            self.collection.delete(ids=ids)
+            deleted += len(ids)
+            if self._sq_index is not None:
+                removed_from_index += self._sq_index.remove(ids)
         
-        if results["ids"]:
-            self.collection.delete(ids=results["ids"])
-            logger.info(f"Deleted {len(results['ids'])} documents matching filter")
-            return len(results["ids"])
-        return 0
+        if deleted:
+            if removed_from_index:
+                self._save_sq_index()
+            self._collection_changed()
+            logger.info(f"Deleted {deleted} documents matching filter")
+        return deleted
     
     def get_all_documents(
         self,
         limit: int = 100,
         offset: int = 0,
+        include: Optional[List[str]] = None,
     ) -> Dict[str, Any]:
-        """Get all documents with pagination."""
+        """Get all documents with pagination (metadata only unless `include` asks for more)."""
         return self.collection.get(
             limit=limit,
             offset=offset,
-            include=["documents", "metadatas"],
+            include=include if include is not None else ["metadatas"],
         )
     
+    def get_all_ids(self, limit: int = 100, offset: int = 0) -> List[str]:
+        """Get document IDs with pagination, without reading any stored fields."""
+        return self.collection.get(limit=limit, offset=offset, include=[])["ids"]
+    
+    # SQLite settings for bulk-import writes: skip the per-commit fsync
+    BULK_PRAGMAS = {"synchronous": "OFF", "temp_store": "MEMORY"}
+    
+    @contextmanager
+    def bulk_ingest(self):
+        """
+        Relax SQLite durability for the adds made by a large import.
+        
+        Only the task (or thread) that entered the block is affected:
+        each of its add_documents() calls switches Chroma's connection to
+        BULK_PRAGMAS for the duration of the write and then restores it,
+        so uploads and deletes running alongside still commit with the
+        normal settings. Index saves are deferred until the last bulk
+        import in the process finishes. A crash during the import can
+        lose or corrupt its writes, so re-run the import after one.
+        """
+        outermost = not _bulk_ingest_active.get()
+        token = _bulk_ingest_active.set(True)
+        with self._bulk_lock:
+            self._bulk_depth += 1
+        if outermost:
+            logger.warning("Bulk ingest mode: SQLite fsync disabled for this import's writes; re-run it after a crash")
+        try:
+            yield self
+        finally:
+            _bulk_ingest_active.reset(token)
+            with self._bulk_lock:
+                self._bulk_depth -= 1
+                last = self._bulk_depth == 0
+            if last:
+                self._save_sq_index(force=True)
+            if outermost:
+                logger.info("Bulk ingest mode finished")
+    
+    @contextmanager
+    def _relaxed_durability(self):
+        """Apply BULK_PRAGMAS to this thread's connection inside bulk_ingest()."""
+        conn = None
+        if _bulk_ingest_active.get():
+            try:
+                # Chroma keeps one SQLite connection per thread. Internal API,
+                # so fall back to normal durability if it moves.
+                conn = self.client._server._sysdb._conn_pool.connect()
+            except AttributeError as e:
+                logger.debug(f"Bulk ingest pragmas unavailable: {e}")
+        if conn is None:
+            yield
+            return
+        
+        restore = {}
+        for pragma, value in self.BULK_PRAGMAS.items():
+            restore[pragma] = conn.execute(f"PRAGMA {pragma}").fetchone()[0]
+            conn.execute(f"PRAGMA {pragma}={value}")
+        try:
+            yield
+        finally:
+            for pragma, value in restore.items():
+                conn.execute(f"PRAGMA {pragma}={value}")
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and size of the query result cache."""
+        return self._cache.stats()
+    
     def count(self) -> int:
         """Get total document count."""
         return self.collection.count()
@@ -258,19 +625,31 @@ class VectorStoreService:
             metadata={
                 "description": "Personal Knowledge Engine document embeddings",
                 "embedding_dimension": settings.embedding_dimension,
+                "hnsw:space": "ip",
             }
         )
+        self._dimension = None
+        if self._sq_index is not None:
+            self._sq_index.clear()
+            self._save_sq_index(force=True)
+        self._collection_changed()
         logger.info("Collection reset complete")
 
 
 # Singleton instance
 _vector_store: Optional[VectorStoreService] = None
+_vector_store_lock = threading.Lock()
 
 
 def get_vector_store() -> VectorStoreService:
     global _vector_store
     if _vector_store is None:
-        _vector_store = VectorStoreService()
-        _vector_store.initialize()
+        # Double-checked so concurrent first requests open Chroma only once
+        with _vector_store_lock:
+            if _vector_store is None:
+                store = VectorStoreService()
+                store.initialize()
+                # Publish only a fully initialized store
+                _vector_store = store
     return _vector_store
 
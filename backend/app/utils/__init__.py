@@ -5,6 +5,10 @@ from .parsers import (
     detect_document_type,
     parse_document,
     parse_document_bytes,
+    parse_document_bytes_async,
+    parse_documents_batch,
+    parse_document_bytes_batch,
+    shutdown_parse_pool,
     BaseParser,
     PDFParser,
     DOCXParser,
@@ -17,7 +21,9 @@ from .chunking import (
     TextChunker,
     get_chunker,
     chunk_text,
+    iter_chunks,
     chunk_text_with_settings,
+    chunk_stats,
 )
 
 __all__ = [
@@ -26,6 +32,10 @@ __all__ = [
     "detect_document_type",
     "parse_document",
     "parse_document_bytes",
+    "parse_document_bytes_async",
+    "parse_documents_batch",
+    "parse_document_bytes_batch",
+    "shutdown_parse_pool",
     "BaseParser",
     "PDFParser",
     "DOCXParser",
@@ -36,6 +46,8 @@ __all__ = [
     "TextChunker",
     "get_chunker",
     "chunk_text",
+    "iter_chunks",
     "chunk_text_with_settings",
+    "chunk_stats",
 ]
 
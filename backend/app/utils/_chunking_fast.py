@@ -0,0 +1,137 @@
+"""
+Compiled chunk-boundary scan for large documents.
+
+TextChunker.chunk spends its time in the interpreter loop for multi-MB
+texts. find_chunk_bounds runs the same algorithm (window stepping, break
+point search, whitespace trimming) over the text's code points as a
+uint32 array, so Numba can compile it to a tight native loop. The Python
+side only slices the text and builds Chunk objects.
+
+Numba is optional: without it NUMBA_AVAILABLE is False and TextChunker
+keeps using its pure-Python path (the kernel below is still importable,
+but running it interpreted would be slower than that path).
+"""
+
+import numpy as np
+
+# Numba (optional - gracefully degrade if not available)
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        def decorator(func):
+            return func
+        return decorator
+
+
+def text_to_codepoints(text: str) -> np.ndarray:
+    """One uint32 per character, so array indices are string indices."""
+    return np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+
+
+@njit(cache=True)
+def _is_space(c):
+    # Code points for which str.isspace() is true
+    return (
+        (9 <= c <= 13) or (28 <= c <= 32) or c == 133 or c == 160
+        or c == 5760 or (8192 <= c <= 8202) or c == 8232 or c == 8233
+        or c == 8239 or c == 8287 or c == 12288
+    )
+
+
+@njit(cache=True)
+def _is_mark(c, marks):
+    for m in marks:
+        if c == m:
+            return True
+    return False
+
+
+@njit(cache=True)
+def _find_break_point(codes, start, end, search_chars, sentence_marks, clause_marks):
+    """Same rules as TextChunker._find_break_point."""
+    search_start = max(start, end - search_chars)
+
+    # Paragraph break
+    for p in range(end - 2, search_start - 1, -1):
+        if codes[p] == 10 and codes[p + 1] == 10:
+            return p + 2
+
+    # Sentence end, then clause separator, followed by whitespace
+    for pass_idx in range(2):
+        marks = sentence_marks if pass_idx == 0 else clause_marks
+        for p in range(end - 2, search_start - 1, -1):
+            if _is_mark(codes[p], marks) and _is_space(codes[p + 1]):
+                q = p + 1
+                while q < end and _is_space(codes[q]):
+                    q += 1
+                return q
+
+    # Any whitespace: break just after the last whitespace character
+    for p in range(end - 1, search_start - 1, -1):
+        if _is_space(codes[p]):
+            return p + 1
+
+    return end
+
+
+@njit(cache=True)
+def _chunk_bounds(codes, chunk_chars, step, search_chars, sentence_marks, clause_marks):
+    n = codes.shape[0]
+    # Upper bound on the number of windows (the loop always advances by at least 1)
+    out = np.empty((n // max(step, 1) + 2, 4), dtype=np.int64)
+    count = 0
+    start = 0
+    while start < n:
+        end = start + chunk_chars
+        if end >= n:
+            end = n
+        else:
+            end = _find_break_point(codes, start, end, search_chars, sentence_marks, clause_marks)
+
+        lo = start
+        hi = end
+        while lo < hi and _is_space(codes[lo]):
+            lo += 1
+        while hi > lo and _is_space(codes[hi - 1]):
+            hi -= 1
+
+        if lo < hi:
+            if count == out.shape[0]:
+                grown = np.empty((out.shape[0] * 2, 4), dtype=np.int64)
+                grown[:count] = out[:count]
+                out = grown
+            out[count, 0] = start
+            out[count, 1] = end
+            out[count, 2] = lo
+            out[count, 3] = hi
+            count += 1
+
+        start += step
+        if count > 0 and start <= out[count - 1, 0]:
+            start = end
+    return out[:count]
+
+
+_SENTENCE_MARKS = np.array([ord(c) for c in ".!?"], dtype=np.uint32)
+_CLAUSE_MARKS = np.array([ord(c) for c in ",;:"], dtype=np.uint32)
+
+
+def find_chunk_bounds(text: str, chunk_chars: int, overlap_chars: int, search_chars: int) -> np.ndarray:
+    """
+    Chunk windows for already-cleaned text, as an (n, 4) int64 array.
+
+    Each row is (start, end, lo, hi): start/end are the window offsets
+    recorded on the Chunk, text[lo:hi] is its whitespace-trimmed content.
+    """
+    return _chunk_bounds(
+        text_to_codepoints(text),
+        chunk_chars,
+        chunk_chars - overlap_chars,
+        search_chars,
+        _SENTENCE_MARKS,
+        _CLAUSE_MARKS,
+    )
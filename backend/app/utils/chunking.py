@@ -1,16 +1,33 @@
 import logging
 import re
-from typing import List, Optional
+import threading
+from typing import Dict, Iterator, List, Optional
 from dataclasses import dataclass
 
+import numpy as np
+
 from ..config import settings
+from ._chunking_fast import NUMBA_AVAILABLE, find_chunk_bounds
 
 logger = logging.getLogger(__name__)
 
+# _clean_text: one str.translate drops control characters (keeping \n and \r)
+# and turns tabs into spaces, then two precompiled passes collapse runs
+_CTRL_TABLE = str.maketrans({
+    **{c: None for c in range(32) if c not in (9, 10, 13)},
+    0x7f: None,
+    9: ' ',
+})
+_NL_RE = re.compile(r'\n{3,}')
+_SP_RE = re.compile(r' {2,}')
+
+# Texts longer than this are chunked by the compiled kernel when Numba is installed
+_FAST_PATH_MIN_CHARS = 100_000
 
-@dataclass
+
+@dataclass(slots=True, frozen=True)
 class Chunk:
-    """Represents a single chunk of text."""
+    """Represents a single chunk of text (immutable, no per-instance __dict__)."""
     content: str
     index: int            # Position in document (0, 1, 2, ...)
     start_char: int       # Start character position in original
@@ -32,6 +49,12 @@ class TextChunker:
         
         self.chunk_size_chars = self.chunk_size * self.chars_per_token
         self.overlap_chars = self.chunk_overlap * self.chars_per_token
+        if self.overlap_chars >= self.chunk_size_chars:
+            # The window would never advance
+            raise ValueError(
+                f"chunk_overlap ({self.chunk_overlap}) must be less than chunk_size ({self.chunk_size})"
+            )
+        self._step = self.chunk_size_chars - self.overlap_chars
         
         logger.info(
             f"TextChunker initialized: {self.chunk_size} tokens "
@@ -40,99 +63,164 @@ class TextChunker:
     
     def chunk(self, text: str) -> List[Chunk]:
         """Split text into overlapping chunks."""
+        return list(self.iter_chunks(text))
+    
+    def iter_chunks(self, text: str) -> Iterator[Chunk]:
+        """Yield the chunks of chunk() one at a time, without building the list."""
         text = self._clean_text(text)
         
         if not text:
             logger.warning("Empty text provided for chunking")
-            return []
+            return
         
         if len(text) <= self.chunk_size_chars:
-            return [Chunk(
+            yield Chunk(
                 content=text,
                 index=0,
                 start_char=0,
                 end_char=len(text),
                 token_count=self._estimate_tokens(text),
-            )]
+            )
+            return
         
-        chunks = []
+        if NUMBA_AVAILABLE and len(text) > _FAST_PATH_MIN_CHARS:
+            yield from self._iter_chunks_fast(text)
+            return
+        
+        # Loop invariants bound to locals for the per-window loop
         start = 0
         chunk_index = 0
+        last_start = -1
+        text_len = len(text)
+        size = self.chunk_size_chars
+        step = self._step
+        find_bp = self._find_break_point
+        chars_per_token = self.chars_per_token
         
-        while start < len(text):
-            end = start + self.chunk_size_chars
+        while start < text_len:
+            end = start + size
             
-            if end >= len(text):
-                end = len(text)
+            if end >= text_len:
+                end = text_len
             else:
-                end = self._find_break_point(text, start, end)
+                end = find_bp(text, start, end)
             
-            chunk_content = text[start:end].strip()
+            # Trim by moving the slice bounds so only one substring is copied;
+            # start/end stay untrimmed as the chunk's recorded offsets
+            lo, hi = start, end
+            while lo < hi and text[lo].isspace():
+                lo += 1
+            while hi > lo and text[hi - 1].isspace():
+                hi -= 1
             
-            if chunk_content:
-                chunks.append(Chunk(
-                    content=chunk_content,
+            if lo < hi:
+                # Token estimate from the trimmed bounds; same as _estimate_tokens(content)
+                yield Chunk(
+                    content=text[lo:hi],
                     index=chunk_index,
                     start_char=start,
                     end_char=end,
-                    token_count=self._estimate_tokens(chunk_content),
-                ))
+                    token_count=(hi - lo) // chars_per_token,
+                )
                 chunk_index += 1
+                last_start = start
             
-            step = self.chunk_size_chars - self.overlap_chars
             start = start + step
             
-            if start <= chunks[-1].start_char if chunks else 0:
+            # Never restart at or before the previous chunk
+            if chunk_index and start <= last_start:
                 start = end
         
-        logger.info(f"Created {len(chunks)} chunks from {len(text)} characters")
-        return chunks
+        logger.info(f"Created {chunk_index} chunks from {text_len} characters")
+    
+    def _iter_chunks_fast(self, text: str) -> Iterator[Chunk]:
+        """Same chunks as iter_chunks(), with the boundary scan done by the compiled kernel."""
+        bounds = find_chunk_bounds(
+            text,
+            self.chunk_size_chars,
+            self.overlap_chars,
+            int(self.chunk_size_chars * 0.2),
+        )
+        chars_per_token = self.chars_per_token
+        for index, (start, end, lo, hi) in enumerate(bounds.tolist()):
+            yield Chunk(
+                content=text[lo:hi],
+                index=index,
+                start_char=start,
+                end_char=end,
+                token_count=(hi - lo) // chars_per_token,
+            )
+        
+        logger.info(f"Created {len(bounds)} chunks from {len(text)} characters (compiled path)")
     
     def _clean_text(self, text: str) -> str:
         """Clean and normalize text before chunking."""
         if not text:
             return ""
         
-        text = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]', '', text)
-        text = re.sub(r'\n{3,}', '\n\n', text)
-        text = re.sub(r' {2,}', ' ', text)
-        text = text.replace('\t', ' ')
-        text = text.strip()
+        text = text.translate(_CTRL_TABLE)
+        text = _NL_RE.sub('\n\n', text)
+        text = _SP_RE.sub(' ', text)
         
-        return text
+        return text.strip()
     
     def _find_break_point(self, text: str, start: int, end: int) -> int:
         """Find a good break point near the target end position."""
         search_start = max(start, end - int(self.chunk_size_chars * 0.2))
         search_text = text[search_start:end]
         
-        break_patterns = [
-            r'\n\n',
-            r'[.!?]\s+',
-            r'[,;:]\s+',
-            r'\s+',
-        ]
+        # Paragraph break (_clean_text leaves no runs longer than two newlines)
+        pos = search_text.rfind('\n\n')
+        if pos >= 0:
+            return search_start + pos + 2
+        
+        # Sentence end, then clause separator, followed by whitespace
+        for marks in ('.!?', ',;:'):
+            pos = self._last_mark_before_space(search_text, marks)
+            if pos >= 0:
+                rest = search_text[pos + 1:]
+                return search_start + pos + 1 + len(rest) - len(rest.lstrip())
         
-        for pattern in break_patterns:
-            matches = list(re.finditer(pattern, search_text))
-            if matches:
-                last_match = matches[-1]
-                return search_start + last_match.end()
+        # Any whitespace: break just after the last whitespace character
+        if search_text and search_text[-1].isspace():
+            return end
+        tail = search_text.rsplit(None, 1)[-1] if search_text.strip() else search_text
+        if len(tail) < len(search_text):
+            return end - len(tail)
         
         return end
     
+    @staticmethod
+    def _last_mark_before_space(text: str, marks: str) -> int:
+        """Index of the last character in `marks` that is followed by whitespace, or -1."""
+        best = -1
+        for mark in marks:
+            hi = len(text)
+            while True:
+                pos = text.rfind(mark, best + 1, hi)
+                if pos < 0:
+                    break
+                if text[pos + 1:pos + 2].isspace():
+                    best = pos
+                    break
+                hi = pos
+        return best
+    
     def _estimate_tokens(self, text: str) -> int:
         """Estimate token count for text."""
         return len(text) // self.chars_per_token
 
 
 _chunker: Optional[TextChunker] = None
+_chunker_lock = threading.Lock()
 
 
 def get_chunker() -> TextChunker:
     global _chunker
     if _chunker is None:
-        _chunker = TextChunker()
+        with _chunker_lock:
+            if _chunker is None:
+                _chunker = TextChunker()
     return _chunker
 
 
@@ -140,6 +228,23 @@ def chunk_text(text: str) -> List[Chunk]:
     return get_chunker().chunk(text)
 
 
+def iter_chunks(text: str) -> Iterator[Chunk]:
+    return get_chunker().iter_chunks(text)
+
+
+def chunk_stats(chunks: List[Chunk]) -> Dict[str, int]:
+    """Aggregate token counts for a chunk list (for ingest logging)."""
+    if not chunks:
+        return {"chunks": 0, "total_tokens": 0, "min_tokens": 0, "max_tokens": 0}
+    tokens = np.fromiter((c.token_count for c in chunks), dtype=np.int64, count=len(chunks))
+    return {
+        "chunks": len(chunks),
+        "total_tokens": int(tokens.sum()),
+        "min_tokens": int(tokens.min()),
+        "max_tokens": int(tokens.max()),
+    }
+
+
 def chunk_text_with_settings(
     text: str,
     chunk_size: int,
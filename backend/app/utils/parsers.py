@@ -1,13 +1,24 @@
+import asyncio
+import hashlib
 import logging
+import multiprocessing
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+import zipfile
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Dict, Any
-from io import BytesIO
+from typing import Callable, Optional, Dict, Any, Final, List, Sequence, Tuple
+from io import BytesIO, StringIO
 
-import fitz  # PyMuPDF
-from docx import Document as DocxDocument
-import markdown
-from bs4 import BeautifulSoup
+import numpy as np
+import lxml.html
+from lxml import etree
 
 # OCR imports (optional - gracefully degrade if not available)
 try:
@@ -17,10 +28,81 @@ try:
 except ImportError:
     OCR_AVAILABLE = False
 
+# Charset detection (optional - non-UTF-8 text falls back to latin-1 if not available)
+try:
+    from charset_normalizer import from_bytes as detect_charset
+    CHARSET_DETECTION_AVAILABLE = True
+except ImportError:
+    CHARSET_DETECTION_AVAILABLE = False
+
+# libdeflate (optional - DOCX parts are inflated with zlib if not available)
+try:
+    import deflate
+    LIBDEFLATE_AVAILABLE = True
+except ImportError:
+    LIBDEFLATE_AVAILABLE = False
+
+from ..config import settings
 from ..models.documents import DocumentType
 
 logger = logging.getLogger(__name__)
 
+# PDFParser empties MuPDF's resource store after every this many pages
+PDF_STORE_SHRINK_PAGES = 50
+# PDFs with at least this many pages are split into page ranges extracted
+# by worker processes; smaller ones are not worth the hand-off
+PDF_PARALLEL_MIN_PAGES = 64
+# PDF bytes at least this large are written to a temporary file for the page
+# range workers to open, instead of being pickled to every one of them
+PDF_SPILL_MIN_BYTES = 16 << 20
+# Worker processes shared by PDF page ranges and parse_document_bytes_async
+PARSE_POOL_WORKERS = min(os.cpu_count() or 1, 4)
+
+# MarkdownParser fast path: markdown made only of ATX headings, +/-/1. list
+# items and plain paragraphs converts to the same text as the full pipeline.
+# Anything else (inline markup, HTML/entities, code, tables, indentation,
+# rules, setext underlines) goes through markdown.
+_MD_COMPLEX_RE = re.compile(r'[*_`\[\]<>\\|~\t\r\x02\x03]|&#?\w+;|^ |^[-= ]+$', re.M)
+_MD_HEADING_RE = re.compile(r'(#{1,6})(.*?)#*$')
+_MD_LIST_ITEM_RE = re.compile(r'(?:[+-]|\d+\.) +')
+# Markdown extensions that only act on text containing one of their markers
+_MD_OPTIONAL_EXTENSIONS = (('tables', ('|',)), ('fenced_code', ('```', '~~~')))
+
+# DOCXParser reads document.xml with the same parser settings as python-docx
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_OFFICE_DOCUMENT_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+_DOCX_XML_PARSER = etree.XMLParser(remove_blank_text=True, resolve_entities=False)
+# Run children python-docx renders as text, besides w:t and w:br
+_DOCX_RUN_CHARS = {_W + "tab": "\t", _W + "ptab": "\t", _W + "cr": "\n", _W + "noBreakHyphen": "-"}
+
+# TextParser decodes files at least this large straight from a read-only mmap
+TEXT_MMAP_MIN_BYTES = 1 << 20
+# Bytes TextParser samples to guess the encoding of non-UTF-8 text
+TEXT_CHARSET_SAMPLE_BYTES = 4096
+
+# ImageParser cuts images at least this tall (after preprocessing) into
+# horizontal strips OCRed concurrently, each by its own tesseract process
+OCR_STRIP_MIN_HEIGHT = 2000
+# Larger images are shrunk to this long edge first: tesseract time grows with
+# pixel count, and ~300 DPI page scans are already around this size
+OCR_MAX_DIMENSION = 2400
+OCR_MAX_WORKERS = min(os.cpu_count() or 1, 4)
+# Part of every OCR cache key: bump it whenever preprocessing or text cleanup
+# changes, so text produced by the old pipeline is no longer served
+OCR_PIPELINE_VERSION = 1
+
+# Converted texts MarkdownParser keeps, keyed by a digest of the markdown source
+MD_TEXT_CACHE_SIZE = 256
+
+# Parse results parse_document/parse_document_bytes keep, keyed by content
+# digest (or path and stat for files), so re-ingesting skips parsing
+PARSE_CACHE_SIZE = 128
+# Characters kept across all entries; least recently used entries are evicted
+# past it. A str takes 1-4 bytes per character, so this is 16-64 MB
+PARSE_CACHE_TOTAL_CHARS = 16 << 20
+# Longer texts are not kept, so one document cannot flush the whole cache
+PARSE_CACHE_MAX_CHARS = 4 << 20
+
 
 class BaseParser(ABC):
     
@@ -33,32 +115,43 @@ class BaseParser(ABC):
         pass
     
     def extract_metadata(self, file_path: Path) -> Dict[str, Any]:
+        # One stat call; a missing or unreadable file reports size 0
+        try:
+            size_bytes = file_path.stat().st_size
+        except OSError:
+            size_bytes = 0
         return {
             "filename": file_path.name,
-            "size_bytes": file_path.stat().st_size if file_path.exists() else 0,
+            "size_bytes": size_bytes,
         }
 
 
 class PDFParser(BaseParser):
+    """
+    PDF text via PyMuPDF, page by page.
+    
+    Pages are extracted with MuPDF's plain-text defaults (whitespace kept,
+    text clipped to the media box) minus TEXT_PRESERVE_LIGATURES, so
+    ligatures come out as their letters and words like "find" match
+    keyword search.
+    
+    PyMuPDF (fitz) and the other format libraries are imported on first use,
+    so processes that never parse a PDF, DOCX or markdown file skip loading them.
+    """
     
     def parse(self, file_path: Path) -> str:
         logger.info(f"Parsing PDF: {file_path}")
         
         try:
-            doc = fitz.open(file_path)
-            
-            text_parts = []
-            for page_num, page in enumerate(doc):
-                page_text = page.get_text("text")
-                
-                if page_text.strip():
-                    text_parts.append(page_text)
-                    
-            doc.close()
+            import fitz  # PyMuPDF
             
-            full_text = "\n\n".join(text_parts)
+            doc = fitz.open(file_path)
+            try:
+                full_text, page_count = self._extract(doc, str(file_path))
+            finally:
+                doc.close()
             
-            logger.info(f"Extracted {len(full_text)} characters from {len(text_parts)} pages")
+            logger.info(f"Extracted {len(full_text)} characters from {page_count} pages")
             return full_text
             
         except Exception as e:
@@ -69,43 +162,175 @@ class PDFParser(BaseParser):
         logger.info(f"Parsing PDF from bytes: {filename}")
         
         try:
-            doc = fitz.open(stream=content, filetype="pdf")
+            import fitz  # PyMuPDF
             
-            text_parts = []
-            for page in doc:
-                page_text = page.get_text("text")
-                if page_text.strip():
-                    text_parts.append(page_text)
-                    
-            doc.close()
+            doc = fitz.open(stream=content, filetype="pdf")
+            try:
+                full_text, _ = self._extract(doc, content)
+            finally:
+                doc.close()
             
-            return "\n\n".join(text_parts)
+            return full_text
             
         except Exception as e:
             logger.error(f"Failed to parse PDF bytes {filename}: {e}")
             raise ValueError(f"Failed to parse PDF: {e}")
     
+    def _extract(self, doc, source) -> Tuple[str, int]:
+        """
+        Text of an open document (see _extract_pages). Large documents are
+        split into page ranges that worker processes reopen from source, a
+        path string or the PDF bytes, and extract in parallel.
+        """
+        page_count = doc.page_count
+        # Pool workers extract whole documents themselves
+        if page_count < PDF_PARALLEL_MIN_PAGES or PARSE_POOL_WORKERS < 2 or _IN_PARSE_WORKER:
+            return self._extract_pages(doc)
+        
+        spill_path = None
+        if isinstance(source, bytes) and len(source) >= PDF_SPILL_MIN_BYTES:
+            # Workers open one temporary file rather than each receiving a copy
+            with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+                f.write(source)
+            source = spill_path = f.name
+        
+        try:
+            bounds = [page_count * i // PARSE_POOL_WORKERS for i in range(PARSE_POOL_WORKERS + 1)]
+            pool = _get_parse_pool()
+            futures = [
+                pool.submit(_extract_pdf_range, source, first, last)
+                for first, last in zip(bounds, bounds[1:])
+            ]
+            # Each range already joins its pages, so joining the non-empty
+            # ranges the same way gives the sequential result
+            results = [future.result() for future in futures]
+        finally:
+            if spill_path is not None:
+                os.unlink(spill_path)
+        full_text = "\n\n".join(text for text, pages in results if pages)
+        return full_text, sum(pages for _, pages in results)
+    
+    def _extract_pages(self, doc, first: int = 0, last: Optional[int] = None) -> Tuple[str, int]:
+        """
+        Text of pages [first, last) of an open document, non-empty pages
+        joined by blank lines, plus the number of pages that had text.
+        """
+        import fitz  # PyMuPDF
+        
+        # Sequential on purpose: PyMuPDF objects must not be used from several
+        # threads at once, so pages are never handed to a thread pool.
+        last = doc.page_count if last is None else last
+        flags = fitz.TEXTFLAGS_TEXT & ~fitz.TEXT_PRESERVE_LIGATURES
+        buf = StringIO()
+        page_count = 0
+        for page_num in range(first, last):
+            page_text = self._extract_page(doc, page_num, flags)
+            if page_text and not page_text.isspace():
+                if page_count:
+                    buf.write("\n\n")
+                buf.write(page_text)
+                page_count += 1
+            if (page_num - first + 1) % PDF_STORE_SHRINK_PAGES == 0:
+                # Release MuPDF's cached fonts/images for pages already done,
+                # which otherwise stay in its store for the whole document
+                fitz.TOOLS.store_shrink(100)
+        full_text = buf.getvalue()
+        buf.close()
+        return full_text, page_count
+    
+    @staticmethod
+    def _extract_page(doc, page_num: int, flags: int) -> str:
+        page = doc.load_page(page_num)
+        # A PDF page whose resources name no fonts cannot draw text, so skip
+        # interpreting its content stream (full-page plots and diagrams are
+        # mostly path operators). Annotations carry their own resources.
+        if doc.is_pdf and not page.get_fonts() and page.first_annot is None and page.first_widget is None:
+            return ""
+        return page.get_text("text", flags=flags)
+    
     def extract_metadata(self, file_path: Path) -> Dict[str, Any]:
         base_meta = super().extract_metadata(file_path)
         
         try:
-            doc = fitz.open(file_path)
-            meta = doc.metadata
-            base_meta.update({
-                "page_count": doc.page_count,
-                "title": meta.get("title", ""),
-                "author": meta.get("author", ""),
-                "subject": meta.get("subject", ""),
-                "creator": meta.get("creator", ""),
-                "creation_date": meta.get("creationDate", ""),
-            })
+            import fitz  # PyMuPDF
             
-            doc.close()
+            doc = fitz.open(file_path)
+            try:
+                base_meta.update(self._metadata(doc))
+            finally:
+                doc.close()
             
         except Exception as e:
             logger.warning(f"Could not extract PDF metadata: {e}")
             
         return base_meta
+    
+    @staticmethod
+    def _metadata(doc) -> Dict[str, Any]:
+        meta = doc.metadata
+        return {
+            "page_count": doc.page_count,
+            "title": meta.get("title", ""),
+            "author": meta.get("author", ""),
+            "subject": meta.get("subject", ""),
+            "creator": meta.get("creator", ""),
+            "creation_date": meta.get("creationDate", ""),
+        }
+
+
+_parse_pool: Optional[ProcessPoolExecutor] = None
+_parse_pool_lock = threading.Lock()
+# Set by _mark_parse_worker in parse pool processes. Not parent_process():
+# under uvicorn --reload the server itself is a multiprocessing child
+_IN_PARSE_WORKER = False
+
+
+def _mark_parse_worker() -> None:
+    """Process pool initializer: stop workers from fanning out to a pool of their own."""
+    global _IN_PARSE_WORKER
+    _IN_PARSE_WORKER = True
+
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    """Process pool for CPU-bound parsing; its workers never submit to it themselves."""
+    global _parse_pool
+    if _parse_pool is None:
+        with _parse_pool_lock:
+            if _parse_pool is None:
+                # spawn, not fork: the server process runs threads (Chroma, watchdog)
+                _parse_pool = ProcessPoolExecutor(
+                    max_workers=PARSE_POOL_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_mark_parse_worker,
+                )
+    return _parse_pool
+
+
+def shutdown_parse_pool() -> None:
+    """
+    Stop the shared pool's workers (call on shutdown). A server started by
+    uvicorn --reload is itself a multiprocessing child, and those exit by
+    joining their children without shutting executors down first.
+    """
+    global _parse_pool
+    with _parse_pool_lock:
+        pool, _parse_pool = _parse_pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+
+def _extract_pdf_range(source, first: int, last: int) -> Tuple[str, int]:
+    """Worker: PDFParser._extract_pages for a PDF given as a path string or bytes."""
+    import fitz  # PyMuPDF
+    
+    if isinstance(source, str):
+        doc = fitz.open(source)
+    else:
+        doc = fitz.open(stream=source, filetype="pdf")
+    try:
+        return _PARSERS[DocumentType.PDF]._extract_pages(doc, first, last)
+    finally:
+        doc.close()
 
 
 class DOCXParser(BaseParser):
@@ -114,25 +339,7 @@ class DOCXParser(BaseParser):
         logger.info(f"Parsing DOCX: {file_path}")
         
         try:
-            doc = DocxDocument(file_path)
-            
-            paragraphs = []
-            for para in doc.paragraphs:
-                text = para.text.strip()
-                if text:
-                    paragraphs.append(text)
-            
-            for table in doc.tables:
-                for row in table.rows:
-                    row_text = []
-                    for cell in row.cells:
-                        cell_text = cell.text.strip()
-                        if cell_text:
-                            row_text.append(cell_text)
-                    if row_text:
-                        paragraphs.append(" | ".join(row_text))
-            
-            full_text = "\n\n".join(paragraphs)
+            full_text = self._extract(file_path)
             
             logger.info(f"Extracted {len(full_text)} characters from DOCX")
             return full_text
@@ -145,33 +352,177 @@ class DOCXParser(BaseParser):
         logger.info(f"Parsing DOCX from bytes: {filename}")
         
         try:
-            doc = DocxDocument(BytesIO(content))
-            
-            paragraphs = []
-            for para in doc.paragraphs:
-                text = para.text.strip()
-                if text:
-                    paragraphs.append(text)
-            
-            for table in doc.tables:
-                for row in table.rows:
-                    row_text = [cell.text.strip() for cell in row.cells if cell.text.strip()]
-                    if row_text:
-                        paragraphs.append(" | ".join(row_text))
-            
-            return "\n\n".join(paragraphs)
+            return self._extract(BytesIO(content))
             
         except Exception as e:
             logger.error(f"Failed to parse DOCX bytes {filename}: {e}")
             raise ValueError(f"Failed to parse DOCX: {e}")
+    
+    def _extract(self, source) -> str:
+        """Body paragraphs, then one " | "-joined line per table row, as python-docx reads them."""
+        try:
+            paragraphs = self._extract_xml(source)
+        except Exception as e:
+            logger.debug(f"Direct DOCX XML read failed, using python-docx: {e}")
+            if hasattr(source, "seek"):
+                source.seek(0)
+            paragraphs = self._extract_docx(source)
+        return "\n\n".join(paragraphs)
+    
+    def _extract_docx(self, source) -> List[str]:
+        from docx import Document as DocxDocument
+        
+        doc = DocxDocument(source)
+        
+        paragraphs = []
+        for para in doc.paragraphs:
+            text = para.text.strip()
+            if text:
+                paragraphs.append(text)
+        
+        for table in doc.tables:
+            # row.cells rebuilds the table's whole cell grid on every call, so
+            # slice one grid instead; merged cells repeat, so text each once
+            grid = table._cells
+            col_count = len(table.columns)
+            cell_texts = {}
+            for start in range(0, len(table.rows) * col_count, col_count):
+                row_text = []
+                for cell in grid[start:start + col_count]:
+                    text = cell_texts.get(id(cell))
+                    if text is None:
+                        text = cell_texts[id(cell)] = cell.text.strip()
+                    if text:
+                        row_text.append(text)
+                if row_text:
+                    paragraphs.append(" | ".join(row_text))
+        
+        return paragraphs
+    
+    def _extract_xml(self, source) -> List[str]:
+        """
+        Same result as _extract_docx, read straight from word/document.xml.
+        
+        python-docx builds a Python proxy object for every paragraph, run and
+        cell; here lxml parses the part and the text is collected from the
+        tree directly, following python-docx's rules for run text, hyperlinks
+        and merged table cells.
+        """
+        with zipfile.ZipFile(source) as package:
+            root = etree.fromstring(self._read_part(package, self._main_part_name(package)), _DOCX_XML_PARSER)
+        body = root.find(_W + "body")
+        
+        paragraphs = []
+        for p in body.iterchildren(_W + "p"):
+            text = self._paragraph_text(p).strip()
+            if text:
+                paragraphs.append(text)
+        
+        for tbl in body.iterchildren(_W + "tbl"):
+            paragraphs.extend(self._table_rows(tbl))
+        
+        return paragraphs
+    
+    @staticmethod
+    def _main_part_name(package: zipfile.ZipFile) -> str:
+        rels = etree.fromstring(package.read("_rels/.rels"), _DOCX_XML_PARSER)
+        for rel in rels:
+            if rel.get("Type") == _OFFICE_DOCUMENT_REL:
+                return rel.get("Target").lstrip("/")
+        raise ValueError("No main document part")
+    
+    @staticmethod
+    def _read_part(package: zipfile.ZipFile, name: str) -> bytes:
+        """Member bytes, inflated with libdeflate when it is installed."""
+        info = package.getinfo(name)
+        if not LIBDEFLATE_AVAILABLE or info.compress_type != zipfile.ZIP_DEFLATED or info.flag_bits & 0x1:
+            return package.read(name)
+        
+        # Raw DEFLATE data starts after the member's local header
+        fp = package.fp
+        fp.seek(info.header_offset)
+        header = fp.read(30)
+        if header[:4] != b"PK\x03\x04":
+            raise zipfile.BadZipFile(f"Bad local header for {name}")
+        name_len, extra_len = struct.unpack("<HH", header[26:30])
+        fp.seek(info.header_offset + 30 + name_len + extra_len)
+        data = deflate.deflate_decompress(fp.read(info.compress_size), info.file_size)
+        if deflate.crc32(data) != info.CRC:
+            raise zipfile.BadZipFile(f"Bad CRC-32 for {name}")
+        return data
+    
+    @staticmethod
+    def _paragraph_text(p) -> str:
+        parts = []
+        for child in p:
+            if child.tag == _W + "r":
+                runs = (child,)
+            elif child.tag == _W + "hyperlink":
+                runs = child.iterchildren(_W + "r")
+            else:
+                continue
+            for run in runs:
+                for e in run:
+                    tag = e.tag
+                    if tag == _W + "t":
+                        parts.append(e.text or "")
+                    elif tag == _W + "br":
+                        # Page and column breaks carry no text
+                        if e.get(_W + "type", "textWrapping") == "textWrapping":
+                            parts.append("\n")
+                    else:
+                        parts.append(_DOCX_RUN_CHARS.get(tag, ""))
+        return "".join(parts)
+    
+    def _table_rows(self, tbl) -> List[str]:
+        # python-docx's layout grid: a cell spanning columns, or continuing a
+        # vertical merge, is repeated in every grid position it covers
+        col_count = len(tbl.find(_W + "tblGrid").findall(_W + "gridCol"))
+        trs = tbl.findall(_W + "tr")
+        cells = []
+        for tr in trs:
+            for tc in tr.iterchildren(_W + "tc"):
+                span, merge = 1, None
+                tc_pr = tc.find(_W + "tcPr")
+                if tc_pr is not None:
+                    grid_span = tc_pr.find(_W + "gridSpan")
+                    if grid_span is not None:
+                        span = int(grid_span.get(_W + "val"))
+                    v_merge = tc_pr.find(_W + "vMerge")
+                    if v_merge is not None:
+                        merge = v_merge.get(_W + "val", "continue")
+                for i in range(span):
+                    if merge == "continue":
+                        cells.append(cells[-col_count])
+                    elif i > 0:
+                        cells.append(cells[-1])
+                    else:
+                        cells.append(tc)
+        
+        cell_texts = {}
+        rows = []
+        for row_idx in range(len(trs)):
+            row_text = []
+            for tc in cells[row_idx * col_count:(row_idx + 1) * col_count]:
+                if tc not in cell_texts:
+                    cell_texts[tc] = "\n".join(
+                        self._paragraph_text(p) for p in tc.iterchildren(_W + "p")
+                    ).strip()
+                if cell_texts[tc]:
+                    row_text.append(cell_texts[tc])
+            if row_text:
+                rows.append(" | ".join(row_text))
+        return rows
 
 
 class MarkdownParser(BaseParser):
     
     def __init__(self):
-        self.md = markdown.Markdown(
-            extensions=['tables', 'fenced_code', 'nl2br']
-        )
+        # markdown.Markdown keeps per-conversion state, so each thread gets its own
+        self._local = threading.local()
+        # Re-ingested or duplicated notes skip conversion; digest -> text, LRU order
+        self._text_cache: "OrderedDict[bytes, str]" = OrderedDict()
+        self._text_cache_lock = threading.Lock()
     
     def parse(self, file_path: Path) -> str:
         logger.info(f"Parsing Markdown: {file_path}")
@@ -196,15 +547,91 @@ class MarkdownParser(BaseParser):
             raise ValueError(f"Failed to parse Markdown: {e}")
     
     def _convert_to_text(self, md_content: str) -> str:
-        self.md.reset()
-        html = self.md.convert(md_content)
-        soup = BeautifulSoup(html, 'html.parser')
-        text = soup.get_text(separator='\n')
-        lines = [line.strip() for line in text.split('\n')]
-        text = '\n'.join(line for line in lines if line)
+        digest = hashlib.blake2b(md_content.encode(), digest_size=16).digest()
+        with self._text_cache_lock:
+            text = self._text_cache.get(digest)
+            if text is not None:
+                self._text_cache.move_to_end(digest)
+                logger.info(f"Converted {len(md_content)} chars MD to {len(text)} chars text (cached)")
+                return text
+        
+        text = self._convert_simple(md_content)
+        if text is None:
+            html = self._get_md(md_content).convert(md_content)
+            text = self._html_to_text(html)
+            # Strip each line and drop the empty ones, all in C
+            text = '\n'.join(filter(None, map(str.strip, text.split('\n'))))
+        
+        with self._text_cache_lock:
+            self._text_cache[digest] = text
+            if len(self._text_cache) > MD_TEXT_CACHE_SIZE:
+                self._text_cache.popitem(last=False)
         
         logger.info(f"Converted {len(md_content)} chars MD to {len(text)} chars text")
         return text
+    
+    def _get_md(self, md_content: str) -> 'markdown.Markdown':
+        """This thread's converter for md_content, reset and ready for a conversion."""
+        # tables and fenced_code add processors that run over every block;
+        # leave them out when the text has none of their markers
+        extensions = tuple(
+            name for name, markers in _MD_OPTIONAL_EXTENSIONS
+            if any(marker in md_content for marker in markers)
+        ) + ('nl2br',)
+        
+        converters = getattr(self._local, 'converters', None)
+        if converters is None:
+            converters = self._local.converters = {}
+        md = converters.get(extensions)
+        if md is None:
+            import markdown
+            
+            md = converters[extensions] = markdown.Markdown(extensions=list(extensions))
+        md.reset()
+        return md
+    
+    @staticmethod
+    def _convert_simple(md_content: str) -> Optional[str]:
+        """Text for markdown the fast path covers (see _MD_COMPLEX_RE), else None."""
+        if _MD_COMPLEX_RE.search(md_content):
+            return None
+        
+        lines = []
+        block_start = True  # a list marker only counts at the start of a block...
+        in_list = False     # ...or on any line of a block that started as a list
+        for line in md_content.split('\n'):
+            if not line:
+                block_start, in_list = True, False
+                continue
+            
+            heading = _MD_HEADING_RE.match(line)
+            if heading:
+                # Headings split the block, even mid-paragraph
+                lines.append(heading.group(2).strip())
+                block_start, in_list = True, False
+                continue
+            
+            item = _MD_LIST_ITEM_RE.match(line)
+            if item and (block_start or in_list):
+                line = line[item.end():]
+                # Nested lists, headings or rules inside an item: let markdown decide
+                if _MD_LIST_ITEM_RE.match(line) or line.startswith('#') or (line and not line.strip('-= ')):
+                    return None
+                in_list = True
+            block_start = False
+            lines.append(line.strip())
+        
+        return '\n'.join(line for line in lines if line)
+    
+    @staticmethod
+    def _html_to_text(html: str) -> str:
+        """Text nodes of an HTML fragment, joined by newlines."""
+        if not html.strip():
+            return ""
+        root = lxml.html.fragment_fromstring(html, create_parent="div")
+        # Drop script/style contents but keep the text that follows them
+        etree.strip_elements(root, "script", "style", "template", with_tail=False)
+        return "\n".join(root.itertext())
 
 
 class TextParser(BaseParser):
@@ -213,15 +640,15 @@ class TextParser(BaseParser):
         logger.info(f"Parsing text file: {file_path}")
         
         try:
-            try:
-                content = file_path.read_text(encoding='utf-8')
-            except UnicodeDecodeError:
-                content = file_path.read_text(encoding='latin-1')
-            
-            content = content.replace('\r\n', '\n').replace('\r', '\n')
+            with open(file_path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size < TEXT_MMAP_MIN_BYTES:
+                    content = self._decode(f.read())
+                else:
+                    # Decode from the mapping so the file is not also held as bytes
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                        content = self._decode(mapped)
             
-            if content.startswith('\ufeff'):
-                content = content[1:]
+            content = self._normalize(content)
             
             logger.info(f"Read {len(content)} characters from text file")
             return content
@@ -234,21 +661,35 @@ class TextParser(BaseParser):
         logger.info(f"Parsing text from bytes: {filename}")
         
         try:
-            try:
-                text = content.decode('utf-8')
-            except UnicodeDecodeError:
-                text = content.decode('latin-1')
-            
-            text = text.replace('\r\n', '\n').replace('\r', '\n')
-            
-            if text.startswith('\ufeff'):
-                text = text[1:]
-            
-            return text
+            return self._normalize(self._decode(content))
             
         except Exception as e:
             logger.error(f"Failed to parse text bytes {filename}: {e}")
             raise ValueError(f"Failed to parse text: {e}")
+    
+    @staticmethod
+    def _decode(data) -> str:
+        try:
+            return str(data, 'utf-8')
+        except UnicodeDecodeError:
+            pass
+        
+        if CHARSET_DETECTION_AVAILABLE:
+            # Guess from a sample so only one more full decode is needed
+            best = detect_charset(bytes(data[:TEXT_CHARSET_SAMPLE_BYTES])).best()
+            if best is not None:
+                try:
+                    return str(data, best.encoding)
+                except (UnicodeDecodeError, LookupError):
+                    pass
+        return str(data, 'latin-1')
+    
+    @staticmethod
+    def _normalize(text: str) -> str:
+        # Most files have no carriage returns; skip both passes for those
+        if '\r' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        return text.removeprefix('\ufeff')
 
 
 class ImageParser(BaseParser):
@@ -257,6 +698,8 @@ class ImageParser(BaseParser):
     def __init__(self):
         if not OCR_AVAILABLE:
             logger.warning("OCR dependencies not available. Install with: pip install pytesseract Pillow")
+        # Part of the OCR cache key; read from tesseract on first use
+        self._tesseract_version: Optional[str] = None
     
     def parse(self, file_path: Path) -> str:
         logger.info(f"Parsing image with OCR: {file_path}")
@@ -265,13 +708,7 @@ class ImageParser(BaseParser):
             raise ValueError("OCR is not available. Please install pytesseract and Pillow.")
         
         try:
-            image = Image.open(file_path)
-            # Pre-process image for better OCR results
-            image = self._preprocess_image(image)
-            text = pytesseract.image_to_string(image)
-            
-            # Clean up the text
-            text = self._clean_ocr_text(text)
+            text = self._ocr_content(file_path.read_bytes())
             
             logger.info(f"Extracted {len(text)} characters from image via OCR")
             return text
@@ -287,13 +724,7 @@ class ImageParser(BaseParser):
             raise ValueError("OCR is not available. Please install pytesseract and Pillow.")
         
         try:
-            image = Image.open(BytesIO(content))
-            # Pre-process image for better OCR results
-            image = self._preprocess_image(image)
-            text = pytesseract.image_to_string(image)
-            
-            # Clean up the text
-            text = self._clean_ocr_text(text)
+            text = self._ocr_content(content)
             
             logger.info(f"Extracted {len(text)} characters from image via OCR")
             return text
@@ -302,18 +733,69 @@ class ImageParser(BaseParser):
             logger.error(f"Failed to parse image bytes {filename}: {e}")
             raise ValueError(f"Failed to parse image with OCR: {e}")
     
+    def _ocr_content(self, content: bytes) -> str:
+        """Cleaned OCR text of an image file's bytes, from the disk cache when possible."""
+        cache_path = self._cache_path(content) if settings.ocr_cache_enabled else None
+        if cache_path is not None:
+            try:
+                text = cache_path.read_text(encoding='utf-8')
+                logger.info(f"Using cached OCR text: {cache_path.name}")
+                try:
+                    # Mark it recently used, so pruning drops colder entries first
+                    os.utime(cache_path)
+                except OSError:
+                    pass
+                return text
+            except FileNotFoundError:
+                pass
+        
+        image = Image.open(BytesIO(content))
+        # Pre-process image for better OCR results
+        image = self._preprocess_image(image)
+        text = self._ocr(image)
+        
+        # Clean up the text
+        text = self._clean_ocr_text(text)
+        
+        if cache_path is not None:
+            try:
+                cache_path.parent.mkdir(parents=True, exist_ok=True)
+                # Write then rename, so a concurrent reader never sees half a file
+                tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+                tmp_path.write_text(text, encoding='utf-8')
+                os.replace(tmp_path, cache_path)
+                _note_ocr_cache_write()
+            except OSError as e:
+                logger.warning(f"Could not write OCR cache: {e}")
+        return text
+    
+    def _cache_path(self, content: bytes) -> Path:
+        # Recognition is deterministic for the same bytes, tesseract build
+        # and preprocessing pipeline
+        if self._tesseract_version is None:
+            self._tesseract_version = str(pytesseract.get_tesseract_version())
+        digest = hashlib.blake2b(content, digest_size=16).hexdigest()
+        return settings.ocr_cache_dir / f"{digest}-{self._tesseract_version}-p{OCR_PIPELINE_VERSION}.txt"
+    
     def _preprocess_image(self, image: 'Image.Image') -> 'Image.Image':
         """Pre-process image for better OCR accuracy."""
-        # Convert to RGB if necessary (handles PNG with alpha, etc.)
-        if image.mode != 'RGB':
+        # Convert to RGB if necessary (handles PNG with alpha, etc.); grayscale,
+        # bilevel and palette images convert to grayscale directly
+        if image.mode not in ('RGB', 'L', '1', 'P'):
             image = image.convert('RGB')
         
         # Convert to grayscale for better OCR
-        image = image.convert('L')
+        if image.mode != 'L':
+            image = image.convert('L')
         
-        # Optional: Increase contrast and size for small images
+        # Shrink oversized photos/scans; otherwise scale up small images
         width, height = image.size
-        if width < 1000 or height < 1000:
+        if max(width, height) > OCR_MAX_DIMENSION:
+            scale = OCR_MAX_DIMENSION / max(width, height)
+            new_size = (max(1, int(width * scale)), max(1, int(height * scale)))
+            # Bilinear is several times faster than Lanczos and enough for text
+            image = image.resize(new_size, Image.Resampling.BILINEAR)
+        elif width < 1000 or height < 1000:
             # Scale up small images
             scale = max(1000 / width, 1000 / height, 1)
             if scale > 1:
@@ -322,14 +804,49 @@ class ImageParser(BaseParser):
         
         return image
     
+    def _ocr(self, image: 'Image.Image') -> str:
+        """Tesseract text of a preprocessed image; tall ones as concurrent strips."""
+        if image.height < OCR_STRIP_MIN_HEIGHT or OCR_MAX_WORKERS < 2:
+            return self._tesseract(image)
+        
+        cuts = self._strip_cuts(image, OCR_MAX_WORKERS)
+        strips = [image.crop((0, top, image.width, bottom)) for top, bottom in zip(cuts, cuts[1:])]
+        # Each call waits on a tesseract subprocess, so threads run them in parallel
+        return "\n".join(_get_ocr_pool().map(self._tesseract, strips))
+    
+    @staticmethod
+    def _tesseract(image: 'Image.Image') -> str:
+        # pytesseract hands tesseract a temp file in image.format, PNG when
+        # unset; raw PGM writes ~100x faster and tesseract reads it by its header
+        image.format = 'PPM'
+        return pytesseract.image_to_string(image)
+    
+    @staticmethod
+    def _strip_cuts(image: 'Image.Image', count: int) -> List[int]:
+        """
+        Row offsets splitting a grayscale image into count strips. Each cut
+        is the row with the least ink near an even split, so it falls between
+        text lines rather than through one.
+        """
+        ink = (np.asarray(image) < 128).sum(axis=1)
+        height = len(ink)
+        window = height // (count * 4)
+        cuts = [0]
+        for i in range(1, count):
+            lo = height * i // count - window
+            segment = ink[lo:lo + 2 * window]
+            # Of the emptiest rows, the one closest to the even split
+            rows = np.flatnonzero(segment == segment.min())
+            cuts.append(lo + int(rows[np.argmin(np.abs(rows - window))]))
+        cuts.append(height)
+        return cuts
+    
     def _clean_ocr_text(self, text: str) -> str:
         """Clean up OCR output text."""
-        # Remove excessive whitespace
-        lines = [line.strip() for line in text.split('\n')]
-        # Remove empty lines but keep paragraph breaks
+        # Strip each line and collapse runs of empty lines to one paragraph break
         cleaned_lines = []
         prev_empty = False
-        for line in lines:
+        for line in map(str.strip, text.split('\n')):
             if line:
                 cleaned_lines.append(line)
                 prev_empty = False
@@ -357,6 +874,52 @@ class ImageParser(BaseParser):
         return base_meta
 
 
+_ocr_pool: Optional[ThreadPoolExecutor] = None
+_ocr_pool_lock = threading.Lock()
+
+
+def _get_ocr_pool() -> ThreadPoolExecutor:
+    global _ocr_pool
+    if _ocr_pool is None:
+        with _ocr_pool_lock:
+            if _ocr_pool is None:
+                _ocr_pool = ThreadPoolExecutor(max_workers=OCR_MAX_WORKERS, thread_name_prefix="ocr")
+    return _ocr_pool
+
+
+# OCR cache files this process wrote since it last pruned the directory
+_ocr_cache_writes = 0
+_ocr_cache_writes_lock = threading.Lock()
+
+
+def _note_ocr_cache_write() -> None:
+    """Prune the OCR cache after every tenth of settings.ocr_cache_max_files writes."""
+    global _ocr_cache_writes
+    max_files = settings.ocr_cache_max_files
+    if max_files <= 0:
+        return
+    with _ocr_cache_writes_lock:
+        _ocr_cache_writes += 1
+        if _ocr_cache_writes < max(1, max_files // 10):
+            return
+        _ocr_cache_writes = 0
+    _prune_ocr_cache(settings.ocr_cache_dir, max_files)
+
+
+def _prune_ocr_cache(cache_dir: Path, max_files: int) -> None:
+    """Delete the least recently used OCR cache files beyond max_files."""
+    entries = []
+    for path in cache_dir.glob("*.txt"):
+        try:
+            entries.append((path.stat().st_mtime, path))
+        except FileNotFoundError:
+            pass  # Pruned by another process
+    entries.sort()
+    for _, path in entries[:max(0, len(entries) - max_files)]:
+        path.unlink(missing_ok=True)
+    logger.debug(f"Pruned OCR cache to {min(len(entries), max_files)} files")
+
+
 PARSER_REGISTRY: Dict[DocumentType, type] = {
     DocumentType.PDF: PDFParser,
     DocumentType.DOCX: DOCXParser,
@@ -365,64 +928,258 @@ PARSER_REGISTRY: Dict[DocumentType, type] = {
     DocumentType.IMAGE: ImageParser,
 }
 
-_parser_instances: Dict[DocumentType, BaseParser] = {}
+# One shared parser per type, built at import so lookups are a single dict access
+_PARSERS: Final[Dict[DocumentType, BaseParser]] = {
+    doc_type: parser_class() for doc_type, parser_class in PARSER_REGISTRY.items()
+}
 
 
 def get_parser(doc_type: DocumentType) -> BaseParser:
-    if doc_type not in _parser_instances:
-        parser_class = PARSER_REGISTRY.get(doc_type)
-        if parser_class is None:
-            raise ValueError(f"No parser available for document type: {doc_type}")
-        _parser_instances[doc_type] = parser_class()
-    
-    return _parser_instances[doc_type]
-
-
-def detect_document_type(filename: str) -> DocumentType:
-    extension = Path(filename).suffix.lower()
-    
-    extension_map = {
-        '.pdf': DocumentType.PDF,
-        '.docx': DocumentType.DOCX,
-        '.doc': DocumentType.DOCX,  # Try DOCX parser for .doc too
-        '.md': DocumentType.MARKDOWN,
-        '.markdown': DocumentType.MARKDOWN,
-        '.txt': DocumentType.TXT,
-        '.text': DocumentType.TXT,
-        '.log': DocumentType.TXT,
-        '.csv': DocumentType.TXT,  # Treat CSV as text for now
-        '.json': DocumentType.TXT,  # Treat JSON as text
-        '.xml': DocumentType.TXT,   # Treat XML as text
-        '.html': DocumentType.TXT,  # Could add HTML parser later
-        '.htm': DocumentType.TXT,
-        # Image types (OCR)
-        '.png': DocumentType.IMAGE,
-        '.jpg': DocumentType.IMAGE,
-        '.jpeg': DocumentType.IMAGE,
-        '.gif': DocumentType.IMAGE,
-        '.bmp': DocumentType.IMAGE,
-        '.tiff': DocumentType.IMAGE,
-        '.tif': DocumentType.IMAGE,
-        '.webp': DocumentType.IMAGE,
-    }
-    
-    doc_type = extension_map.get(extension)
+    try:
+        return _PARSERS[doc_type]
+    except KeyError:
+        raise ValueError(f"No parser available for document type: {doc_type}") from None
+
+
+_EXTENSION_MAP: Final[Dict[str, DocumentType]] = {
+    '.pdf': DocumentType.PDF,
+    '.docx': DocumentType.DOCX,
+    '.doc': DocumentType.DOCX,  # Try DOCX parser for .doc too
+    '.md': DocumentType.MARKDOWN,
+    '.markdown': DocumentType.MARKDOWN,
+    '.txt': DocumentType.TXT,
+    '.text': DocumentType.TXT,
+    '.log': DocumentType.TXT,
+    '.csv': DocumentType.TXT,  # Treat CSV as text for now
+    '.json': DocumentType.TXT,  # Treat JSON as text
+    '.xml': DocumentType.TXT,   # Treat XML as text
+    '.html': DocumentType.TXT,  # Could add HTML parser later
+    '.htm': DocumentType.TXT,
+    # Image types (OCR)
+    '.png': DocumentType.IMAGE,
+    '.jpg': DocumentType.IMAGE,
+    '.jpeg': DocumentType.IMAGE,
+    '.gif': DocumentType.IMAGE,
+    '.bmp': DocumentType.IMAGE,
+    '.tiff': DocumentType.IMAGE,
+    '.tif': DocumentType.IMAGE,
+    '.webp': DocumentType.IMAGE,
+}
+
+
+# Leading four bytes (as a little-endian int) of formats whose content is
+# unambiguous, so a misnamed upload is still parsed by the right parser
+_MAGIC_TYPES: Final[Dict[int, DocumentType]] = {
+    int.from_bytes(magic, 'little'): doc_type
+    for magic, doc_type in (
+        (b'%PDF', DocumentType.PDF),
+        (b'PK\x03\x04', DocumentType.DOCX),
+        (b'\x89PNG', DocumentType.IMAGE),
+        (b'GIF8', DocumentType.IMAGE),
+        (b'II*\x00', DocumentType.IMAGE),  # TIFF, little-endian
+        (b'MM\x00*', DocumentType.IMAGE),  # TIFF, big-endian
+    )
+}
+# Every ZIP container starts PK\x03\x04. Under these extensions it is taken
+# as DOCX outright; under others (.xlsx, .pptx, .odt, .epub, .zip) only if
+# the archive holds a Word document body
+_DOCX_ZIP_EXTENSIONS = frozenset({'', '.docx', '.doc'})
+
+
+def _is_docx_archive(content: bytes) -> bool:
+    try:
+        with zipfile.ZipFile(BytesIO(content)) as archive:
+            archive.getinfo('word/document.xml')
+        return True
+    except (zipfile.BadZipFile, KeyError):
+        return False
+
+
+def detect_document_type(filename: str, content: Optional[bytes] = None) -> DocumentType:
+    # Path(filename).suffix without building a Path: the last dot of the
+    # final component, ignoring leading dots and a trailing dot
+    filename = filename.rstrip('/')
+    name = filename[filename.rfind('/') + 1:]
+    dot = name.rfind('.')
+    extension = name[dot:].lower() if 0 < dot < len(name) - 1 else ''
+    
+    # File signature first, when the content is at hand
+    if content is not None:
+        doc_type = _MAGIC_TYPES.get(int.from_bytes(content[:4], 'little'))
+        if (doc_type == DocumentType.DOCX and extension not in _DOCX_ZIP_EXTENSIONS
+                and not _is_docx_archive(content)):
+            doc_type = None
+        if doc_type is not None:
+            return doc_type
+    
+    doc_type = _EXTENSION_MAP.get(extension)
     if doc_type is None:
         raise ValueError(f"Unsupported file type: {extension}")
     
     return doc_type
 
 
+_parse_cache: "OrderedDict[Tuple, tuple[str, DocumentType]]" = OrderedDict()
+_parse_cache_chars = 0  # Total text length held in _parse_cache
+_parse_cache_lock = threading.Lock()
+
+
+def _parse_cache_get(key: Tuple) -> Optional[tuple[str, DocumentType]]:
+    with _parse_cache_lock:
+        result = _parse_cache.get(key)
+        if result is not None:
+            _parse_cache.move_to_end(key)
+            logger.info(f"Using cached {result[1].value} text ({len(result[0])} characters)")
+        return result
+
+
+def _parse_cache_put(key: Tuple, result: tuple[str, DocumentType]) -> None:
+    global _parse_cache_chars
+    if len(result[0]) > PARSE_CACHE_MAX_CHARS:
+        return
+    with _parse_cache_lock:
+        previous = _parse_cache.pop(key, None)
+        if previous is not None:
+            _parse_cache_chars -= len(previous[0])
+        _parse_cache[key] = result
+        _parse_cache_chars += len(result[0])
+        while len(_parse_cache) > PARSE_CACHE_SIZE or _parse_cache_chars > PARSE_CACHE_TOTAL_CHARS:
+            _parse_cache_chars -= len(_parse_cache.popitem(last=False)[1][0])
+
+
+def _cached_parse(key: Tuple, parse: Callable[[], str], doc_type: DocumentType) -> tuple[str, DocumentType]:
+    result = _parse_cache_get(key)
+    if result is None:
+        result = (parse(), doc_type)
+        _parse_cache_put(key, result)
+    return result
+
+
+def _bytes_cache_key(doc_type: DocumentType, content: bytes) -> Tuple:
+    return (doc_type, hashlib.blake2b(content, digest_size=16).digest())
+
+
 def parse_document(file_path: Path) -> tuple[str, DocumentType]:
     doc_type = detect_document_type(file_path.name)
     parser = get_parser(doc_type)
-    text = parser.parse(file_path)
-    return text, doc_type
+    # Keyed by stat rather than content, so a hit does not read the file
+    stat = file_path.stat()
+    key = (doc_type, os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+    return _cached_parse(key, lambda: parser.parse(file_path), doc_type)
 
 
 def parse_document_bytes(content: bytes, filename: str) -> tuple[str, DocumentType]:
-    doc_type = detect_document_type(filename)
+    doc_type = detect_document_type(filename, content)
     parser = get_parser(doc_type)
-    text = parser.parse_bytes(content, filename)
-    return text, doc_type
+    key = _bytes_cache_key(doc_type, content)
+    return _cached_parse(key, lambda: parser.parse_bytes(content, filename), doc_type)
+
+
+async def parse_document_bytes_async(content: bytes, filename: str) -> tuple[str, DocumentType]:
+    """
+    parse_document_bytes without blocking the event loop. DOCX and image
+    parsing holds the GIL, so it runs in the shared worker process pool
+    (the parse cache is still checked and filled here). PDFs and other
+    formats run in the loop's default thread pool; large PDFs fan their
+    page ranges out to the process pool from there.
+    """
+    loop = asyncio.get_running_loop()
+    doc_type = detect_document_type(filename, content)
+    if doc_type == DocumentType.PDF:
+        return await loop.run_in_executor(None, _parse_pdf_bytes_locked, content, filename)
+    if doc_type not in _PROCESS_POOL_TYPES:
+        return await loop.run_in_executor(None, parse_document_bytes, content, filename)
+    
+    key = _bytes_cache_key(doc_type, content)
+    result = _parse_cache_get(key)
+    if result is None:
+        result = await loop.run_in_executor(_get_parse_pool(), parse_document_bytes, content, filename)
+        _parse_cache_put(key, result)
+    return result
+
+
+# PyMuPDF is not thread-safe; serializes PDFs parsed on executor threads
+_pdf_thread_lock = threading.Lock()
+
+
+def _parse_pdf_bytes_locked(content: bytes, filename: str) -> tuple[str, DocumentType]:
+    with _pdf_thread_lock:
+        return parse_document_bytes(content, filename)
 
+
+# Batch parsing: formats whose parsing is CPU-bound (in Python, or in C code
+# holding the GIL) go to worker processes; formats whose parser is safe to
+# share between threads go to a thread pool; anything else runs inline
+_PROCESS_POOL_TYPES = frozenset({DocumentType.PDF, DocumentType.DOCX, DocumentType.IMAGE})
+_THREAD_POOL_TYPES = frozenset({DocumentType.TXT, DocumentType.MARKDOWN})
+# Below this many bytes of process-pool documents, shipping them to worker
+# processes (and starting the pool, the first time) costs more than it saves
+BATCH_PROCESS_POOL_MIN_BYTES = 8 << 20
+
+
+def parse_documents_batch(
+    file_paths: Sequence[Path],
+    max_workers: Optional[int] = None,
+) -> List[tuple[str, DocumentType]]:
+    """parse_document for many files at once; results are in input order."""
+    return _run_batch(
+        [(path,) for path in file_paths],
+        [detect_document_type(path.name) for path in file_paths],
+        [path.stat().st_size for path in file_paths],
+        parse_document,
+        max_workers,
+    )
+
+
+def parse_document_bytes_batch(
+    documents: Sequence[Tuple[bytes, str]],
+    max_workers: Optional[int] = None,
+) -> List[tuple[str, DocumentType]]:
+    """parse_document_bytes for many (content, filename) pairs; results are in input order."""
+    return _run_batch(
+        [(content, filename) for content, filename in documents],
+        [detect_document_type(filename, content) for content, filename in documents],
+        [len(content) for content, _ in documents],
+        parse_document_bytes,
+        max_workers,
+    )
+
+
+def _run_batch(args_list, doc_types, sizes, worker, max_workers: Optional[int]) -> List[tuple[str, DocumentType]]:
+    # Caps the thread pool; process-pool formats share _get_parse_pool()
+    max_workers = max_workers or os.cpu_count() or 1
+    in_processes = [i for i, doc_type in enumerate(doc_types) if doc_type in _PROCESS_POOL_TYPES]
+    if len(in_processes) < 2 or sum(sizes[i] for i in in_processes) < BATCH_PROCESS_POOL_MIN_BYTES:
+        in_processes = []
+    in_threads = [i for i, doc_type in enumerate(doc_types) if doc_type in _THREAD_POOL_TYPES]
+    pooled = set(in_processes) | set(in_threads)
+    results: List[Optional[tuple[str, DocumentType]]] = [None] * len(args_list)
+    
+    futures = {}
+    thread_pool = None
+    try:
+        if in_processes:
+            # The shared long-lived pool (PARSE_POOL_WORKERS processes), so
+            # batches don't each pay interpreter and library start-up
+            process_pool = _get_parse_pool()
+            futures.update({i: process_pool.submit(worker, *args_list[i]) for i in in_processes})
+        if in_threads:
+            thread_pool = ThreadPoolExecutor(
+                max_workers=min(max_workers, len(in_threads)),
+                thread_name_prefix="parse",
+            )
+            futures.update({i: thread_pool.submit(worker, *args_list[i]) for i in in_threads})
+        
+        for i in range(len(args_list)):
+            if i not in pooled:
+                results[i] = worker(*args_list[i])
+        for i, future in futures.items():
+            results[i] = future.result()
+    finally:
+        # On failure, drop this batch's queued work; the shared pool stays up
+        for future in futures.values():
+            future.cancel()
+        if thread_pool is not None:
+            thread_pool.shutdown(cancel_futures=True)
+    
+    return results
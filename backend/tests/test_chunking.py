@@ -0,0 +1,41 @@
+"""Tests for the text chunker."""
+
+import random
+
+import pytest
+
+from app.utils.chunking import TextChunker
+from app.utils._chunking_fast import find_chunk_bounds
+
+
+def _random_text(seed, length):
+    rng = random.Random(seed)
+    pieces = ["word", "Sentence.", "clause,", "end!", "why?", "semi;", "\n\n", "\n", " ", "  ", "\xa0", "\u3000", "x"]
+    return "".join(rng.choice(pieces) + " " for _ in range(length))
+
+
+class TestTextChunker:
+    """Test cases for TextChunker."""
+
+    def test_kernel_matches_python_path(self):
+        """The compiled-path kernel must produce exactly the pure-Python chunks."""
+        for seed, (size, overlap) in enumerate([(20, 5), (50, 10), (8, 7)]):
+            chunker = TextChunker(chunk_size=size, chunk_overlap=overlap)
+            text = chunker._clean_text(_random_text(seed, 600))
+            expected = [
+                (c.start_char, c.end_char, c.content) for c in chunker.chunk(text)
+            ]
+
+            bounds = find_chunk_bounds(
+                text,
+                chunker.chunk_size_chars,
+                chunker.overlap_chars,
+                int(chunker.chunk_size_chars * 0.2),
+            )
+            actual = [(start, end, text[lo:hi]) for start, end, lo, hi in bounds.tolist()]
+            assert actual == expected
+
+    def test_overlap_must_be_smaller_than_chunk(self):
+        """An overlap that would stop the window advancing is rejected up front."""
+        with pytest.raises(ValueError):
+            TextChunker(chunk_size=10, chunk_overlap=10)
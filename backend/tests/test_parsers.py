@@ -0,0 +1,83 @@
+"""Tests for document parsers."""
+
+import random
+import zipfile
+from io import BytesIO
+
+import docx
+import pytest
+
+from app.models.documents import DocumentType
+from app.utils.parsers import DOCXParser, MarkdownParser, detect_document_type
+
+
+def _full_pipeline(parser, md_content):
+    text = parser._html_to_text(parser._get_md(md_content).convert(md_content))
+    lines = [line.strip() for line in text.split('\n')]
+    return '\n'.join(line for line in lines if line)
+
+
+class TestMarkdownParser:
+    """Test cases for MarkdownParser."""
+
+    def test_simple_path_matches_markdown(self):
+        """Whenever the fast path applies it must give the full pipeline's text."""
+        parser = MarkdownParser()
+        pieces = ["# ", "## ", "#", "- ", "+ ", "1. ", "2020. ", "-", "3.14 ", "text", "a = b",
+                  " #", "# x #", "C#", "\n", "\n\n", "\n\n\n", "=", "--", " ", "\xa0", "R&D"]
+        rng = random.Random(0)
+        checked = 0
+        for _ in range(3000):
+            md_content = "".join(rng.choice(pieces) for _ in range(rng.randint(1, 20)))
+            text = parser._convert_simple(md_content)
+            if text is not None:
+                assert text == _full_pipeline(parser, md_content), repr(md_content)
+                checked += 1
+        assert checked > 0
+
+    def test_inline_markup_uses_markdown(self):
+        """Emphasis, links and code are left to the markdown library."""
+        for md_content in ("some *text*", "[a](b)", "`x`", "<b>x</b>", "a | b", "    code"):
+            assert MarkdownParser._convert_simple(md_content) is None
+
+
+class TestDOCXParser:
+    """Test cases for DOCXParser."""
+
+    def test_xml_read_matches_python_docx(self):
+        """The direct XML read gives python-docx's text, merged cells included."""
+        document = docx.Document()
+        document.add_paragraph("First paragraph")
+        run = document.add_paragraph().add_run("tab\there")
+        run.add_break()
+        run.add_text("after break")
+        table = document.add_table(rows=3, cols=3)
+        for i, cell in enumerate(table._cells):
+            cell.text = f"c{i}"
+        table.cell(0, 0).merge(table.cell(1, 1))
+        table.cell(2, 1).add_paragraph("second line")
+        buffer = BytesIO()
+        document.save(buffer)
+
+        parser = DOCXParser()
+        content = buffer.getvalue()
+        expected = parser._extract_docx(BytesIO(content))
+        assert parser._extract_xml(BytesIO(content)) == expected
+        assert parser.parse_bytes(content, "test.docx") == "\n\n".join(expected)
+
+
+class TestDetectDocumentType:
+    """Test cases for detect_document_type."""
+
+    def test_zip_containers_are_not_docx(self):
+        """Only ZIP archives holding a Word body are sniffed as DOCX."""
+        archive = BytesIO()
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("xl/workbook.xml", "<workbook/>")
+        with pytest.raises(ValueError, match="Unsupported file type"):
+            detect_document_type("sheet.xlsx", archive.getvalue())
+        assert detect_document_type("upload", archive.getvalue()) == DocumentType.DOCX
+
+        document = BytesIO()
+        docx.Document().save(document)
+        assert detect_document_type("report.bin", document.getvalue()) == DocumentType.DOCX
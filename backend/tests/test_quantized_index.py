@@ -0,0 +1,92 @@
+"""Tests for the int8 quantized sidecar index."""
+
+import numpy as np
+from app.services.quantized_index import QuantizedIndex
+
+
+def _unit_vectors(n, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class TestQuantizedIndex:
+    """Test cases for QuantizedIndex."""
+
+    def test_search_finds_nearest_vector(self, tmp_path):
+        """The exact nearest neighbour should be among the int8 candidates."""
+        vectors = _unit_vectors(500, 32)
+        ids = [f"chunk_{i}" for i in range(len(vectors))]
+
+        index = QuantizedIndex(tmp_path)
+        index.add(ids, vectors)
+
+        query = vectors[42]
+        for space in ("l2", "ip", "cosine"):
+            candidates = index.search(query, n=5, space=space)
+            assert candidates[0] == "chunk_42"
+
+    def test_float16_codes(self, tmp_path):
+        """float16 codes rank like the int8 ones and reload with their dtype."""
+        vectors = _unit_vectors(300, 16)
+        ids = [f"chunk_{i}" for i in range(len(vectors))]
+
+        index = QuantizedIndex(tmp_path, dtype="float16")
+        index.add(ids, vectors)
+        index.save()
+        for space in ("l2", "ip", "cosine"):
+            assert index.search(vectors[7], n=3, space=space)[0] == "chunk_7"
+
+        assert QuantizedIndex(tmp_path, dtype="float16").load()
+        assert not QuantizedIndex(tmp_path).load()
+
+    def test_remove_and_reload(self, tmp_path):
+        """Removed ids disappear and the index survives a save/load round trip."""
+        vectors = _unit_vectors(20, 8)
+        ids = [f"chunk_{i}" for i in range(len(vectors))]
+
+        index = QuantizedIndex(tmp_path)
+        index.add(ids, vectors)
+        assert index.remove(["chunk_3", "missing"]) == 1
+        index.save()
+
+        reloaded = QuantizedIndex(tmp_path)
+        assert reloaded.load()
+        assert len(reloaded) == 19
+        assert "chunk_3" not in reloaded.search(vectors[3], n=19)
+
+    def test_pca_projection(self, tmp_path):
+        """With PCA enabled the index stores fewer dimensions but still finds the neighbour."""
+        rng = np.random.default_rng(1)
+        # Low-rank data plus noise, so a few components explain most of it
+        basis = rng.normal(size=(8, 64)).astype(np.float32)
+        vectors = rng.normal(size=(400, 8)).astype(np.float32) @ basis
+        vectors += 0.01 * rng.normal(size=vectors.shape).astype(np.float32)
+        ids = [f"chunk_{i}" for i in range(len(vectors))]
+
+        index = QuantizedIndex(tmp_path, pca_components=16)
+        index.add(ids[:100], vectors[:100])
+        index.add(ids[100:], vectors[100:])
+        index.save()
+
+        reloaded = QuantizedIndex(tmp_path, pca_components=16)
+        assert reloaded.load()
+        assert reloaded.dimension == 64
+        assert reloaded._codes.shape[0] == 16
+        assert reloaded.search(vectors[123], n=5)[0] == "chunk_123"
+        assert not QuantizedIndex(tmp_path).load()
+
+    def test_save_keeps_buffer_writable(self, tmp_path):
+        """save() clears the dirty flag and later adds reuse the in-memory codes."""
+        vectors = _unit_vectors(40, 8)
+        index = QuantizedIndex(tmp_path)
+        assert not index.dirty
+        index.add([f"chunk_{i}" for i in range(20)], vectors[:20])
+        assert index.dirty
+        index.save()
+        assert not index.dirty
+        assert index._codes.flags.writeable
+
+        index.add([f"chunk_{i}" for i in range(20, 40)], vectors[20:])
+        assert index.dirty
+        assert index.search(vectors[33], n=3)[0] == "chunk_33"
@@ -1,6 +1,8 @@
 """Tests for the vector store service."""
 
+import numpy as np
 import pytest
+from app.services.query_cache import QueryCache
 from app.services.vector_store import VectorStoreService
 
 
@@ -33,7 +35,7 @@ class TestVectorStoreService:
         
         # Query
         results = store.query(
-            query_embedding=test_embedding,
+            query_embeddings=test_embedding,
             n_results=1,
         )
         
@@ -42,3 +44,17 @@ class TestVectorStoreService:
         # Cleanup
         store.delete_document(test_id)
 
+    
+    def test_query_cache_drops_results_from_before_a_write(self):
+        """A result read before clear() must not be cached after it."""
+        cache = QueryCache(max_size=4)
+        embedding = np.ones(8, dtype=np.float32)
+        params = QueryCache.params_key(1, None, ["documents"])
+        
+        generation = cache.generation
+        cache.clear()  # A write lands while the query runs
+        cache.put(embedding, params, {"ids": ["stale"]}, generation)
+        assert cache.get(embedding, params) is None
+        
+        cache.put(embedding, params, {"ids": ["fresh"]}, cache.generation)
+        assert cache.get(embedding, params) == {"ids": ["fresh"]}